@@ -1,25 +1,37 @@
 import os
+import re
+import sys
 import logging
 import asyncio
-import uuid
-from datetime import datetime, timedelta
-from decimal import Decimal
-from telegram import Update, BotCommand
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from datetime import datetime
+from telegram import Update, BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
+    CallbackQueryHandler,
     ContextTypes,
     CallbackContext
 )
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json
 import requests
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-# Setup logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+# Sync engine dipakai bersama dengan scheduler (folder scheduler/ di-mount read-only)
+SYNC_ENGINE_PATH = os.getenv('SYNC_ENGINE_PATH', '/app/engine')
+sys.path.insert(0, SYNC_ENGINE_PATH)
+import log_pipeline
+from log_pipeline import log_context, get_log_context, new_run_id
+
+# Setup logging - lewat queue (non-blocking), JSON ke file yang di-rotate
+BOT_LOG_FILE = os.getenv('BOT_LOG_FILE', '/app/data/logs/bot.log')
+log_pipeline.setup_logging(
+    BOT_LOG_FILE,
+    fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
@@ -42,72 +54,38 @@ MSSQL_CONFIG = {
     'password': os.getenv('DB_PASSWORD_TARGET', '')
 }
 
+import sync_scheduler as sync_engine
+from job_groups import parse_table_list
+from cron import CronExpression
+from pushdown import check_pushdown
+from profiling import maybe_profile
+from cancellation import JobWatch, request_cancel, prune_stale_jobs
+from fanout import validate_targets, known_targets
+
 N8N_API_URL = os.getenv('N8N_API_URL', '')
 N8N_API_KEY = os.getenv('N8N_API_KEY', '')
 
 # Global variables untuk info loop
 info_loop_tasks = {}
 
+# Pagination /schedule dan /info (keyset per nama jadwal)
+SCHEDULE_PAGE_SIZE = int(os.getenv('SCHEDULE_PAGE_SIZE', '10'))
+SCHEDULE_PAGE_CACHE_SECONDS = int(os.getenv('SCHEDULE_PAGE_CACHE_SECONDS', '30'))
+TELEGRAM_MAX_MESSAGE = 4096
+
 class DatabaseManager:
     @staticmethod
     def get_connection():
         return psycopg2.connect(**DB_CONFIG)
     
-    @staticmethod
-    def get_mssql_connection():
-        """Get MSSQL connection using pyodbc"""
-        import pyodbc
-        import os
-        
-        # Debug: Print env values
-        # logger.info("=" * 50)
-        # logger.info("DEBUG MSSQL_CONFIG from env:")
-        # logger.info(f"  DB_HOST_TARGET = '{os.getenv('DB_HOST_TARGET')}'")
-        # logger.info(f"  DB_PORT_TARGET = '{os.getenv('DB_PORT_TARGET')}'")
-        # logger.info(f"  DB_NAME_TARGET = '{os.getenv('DB_NAME_TARGET')}'")
-        # logger.info(f"  DB_USER_TARGET = '{os.getenv('DB_USER_TARGET')}'")
-        # logger.info(f"  DB_PASSWORD_TARGET = {'***' if os.getenv('DB_PASSWORD_TARGET') else 'EMPTY!'}")
-        
-        # Get from env directly (bypass MSSQL_CONFIG)
-        host = os.getenv('DB_HOST_TARGET', '')
-        port = os.getenv('DB_PORT_TARGET', '')
-        database = os.getenv('DB_NAME_TARGET', '')
-        user = os.getenv('DB_USER_TARGET', '')
-        password = os.getenv('DB_PASSWORD_TARGET', '')
-        
-        # logger.info(f"DEBUG: host='{host}', port='{port}', db='{database}'")
-        
-        if not host or not port or not database or not user or not password:
-            logger.error("❌ MSSQL env variables are EMPTY!")
-            raise ValueError("MSSQL configuration incomplete - check environment variables")
-        
-        conn_str = (
-            f"DRIVER={{FreeTDS}};"
-            f"SERVER={host};"
-            f"PORT={port};"
-            f"DATABASE={database};"
-            f"UID={user};"
-            f"PWD={password};"
-            f"TDS_Version=7.4;"
-        )
-        
-        logger.info(f"Connection string: {conn_str.replace(password, '***')}")
-        logger.info("Attempting connection...")
-        
-        try:
-            conn = pyodbc.connect(conn_str)
-            logger.info("✅ Connected to MSSQL successfully!")
-            return conn
-        except Exception as e:
-            logger.error(f"❌ Connection failed: {e}")
-            raise
-    
     @staticmethod
     def execute_query(query, params=None, fetch=False):
         try:
             with DatabaseManager.get_connection() as conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     cur.execute(query, params)
+                    if SCHEDULE_WRITE_RE.search(query):
+                        schedule_pager.invalidate()
                     if fetch:
                         return cur.fetchall()
                     conn.commit()
@@ -117,107 +95,70 @@ class DatabaseManager:
             raise
     
     @staticmethod
-    def manual_sync_table(schema, table):
+    def manual_sync_table(schema, table, profile=False):
         """
         Manual sync satu tabel dari MSSQL ke PostgreSQL
+        profile=True: jalan di bawah cProfile + tracemalloc, hasil disimpan
+        di sync_profiles (run_id sama dengan baris sync_logs)
         Returns: tuple (success, message, records_count)
         """
-        start_time = datetime.now()
-        
-        def convert_value(val):
-            """Convert special types for PostgreSQL compatibility"""
-            if val is None:
-                return None
-            elif isinstance(val, uuid.UUID):
-                return str(val)
-            elif isinstance(val, Decimal):
-                return float(val)
-            elif isinstance(val, (datetime, timedelta)):
-                return val
-            elif isinstance(val, bytes):
-                return val.hex()
-            else:
-                return val
-        
-        try:
-            # 1. Get data from MSSQL
-            logger.info(f"Fetching data from MSSQL: {schema}.{table}")
-            mssql_conn = DatabaseManager.get_mssql_connection()
-            mssql_cursor = mssql_conn.cursor()
-            
-            query_mssql = f"SELECT * FROM [{schema}].[{table}]"
-            mssql_cursor.execute(query_mssql)
-            
-            # Get column names dari cursor.description
-            columns = [column[0] for column in mssql_cursor.description]
-            
-            # Fetch all rows
-            raw_rows = mssql_cursor.fetchall()
-            
-            mssql_cursor.close()
-            mssql_conn.close()
-            
-            if not raw_rows:
-                return (True, "Tabel kosong, tidak ada data untuk disinkronkan", 0)
+        run_id = new_run_id()
+        with log_context(schedule='manual_sync', table=f"{schema}.{table}", run_id=run_id):
+            # Terdaftar di sync_jobs selama jalan, bisa dibatalkan dengan /sync cancel
+            with JobWatch(sync_engine.get_pg_connection, run_id, 'manual_sync', f"{schema}.{table}") as watch:
+                with maybe_profile(profile, f"manual_sync {schema}.{table}") as session:
+                    success, message, records_count = DatabaseManager._manual_sync_table(schema, table)
             
-            records_count = len(raw_rows)
-            logger.info(f"Fetched {records_count} records from MSSQL")
+            if watch.cancelled:
+                success, message, records_count = False, f"Dibatalkan: {watch.reason}", 0
             
-            # 2. Convert rows to dict format
-            rows = []
-            for raw_row in raw_rows:
-                row_dict = {col: val for col, val in zip(columns, raw_row)}
-                rows.append(row_dict)
+            if session is not None:
+                profile_id = sync_engine.save_profile(session, 'manual_sync', schema, table)
+                message += f"\n\n🔬 Profile #{profile_id} (run {run_id})\n{session.summary()}"
             
-            # 3. Convert all values
-            converted_rows = []
-            for row in rows:
-                converted_row = {col: convert_value(row[col]) for col in columns}
-                converted_rows.append(converted_row)
-            
-            # 4. Truncate PostgreSQL table
-            logger.info(f"Truncating PostgreSQL table: {schema}.{table}")
-            pg_conn = DatabaseManager.get_connection()
-            pg_cursor = pg_conn.cursor()
-            
-            truncate_query = f"TRUNCATE TABLE {schema}.{table} CASCADE"
-            pg_cursor.execute(truncate_query)
-            pg_conn.commit()
-            
-            # 5. Insert data to PostgreSQL
-            logger.info(f"Inserting {records_count} records to PostgreSQL")
-            
-            # Build insert query
-            columns_str = ', '.join([f'"{col}"' for col in columns])
-            placeholders = ', '.join(['%s'] * len(columns))
-            insert_query = f"INSERT INTO {schema}.{table} ({columns_str}) VALUES ({placeholders})"
-            
-            # Insert in batches
-            batch_size = 1000
-            inserted_count = 0
-            for i in range(0, len(converted_rows), batch_size):
-                batch = converted_rows[i:i + batch_size]
-                values = [tuple(row[col] for col in columns) for row in batch]
-                pg_cursor.executemany(insert_query, values)
-                pg_conn.commit()
-                inserted_count += len(batch)
-                logger.info(f"Inserted batch {i//batch_size + 1}: {len(batch)} records")
+            return success, message, records_count
+    
+    @staticmethod
+    def _manual_sync_table(schema, table):
+        start_time = datetime.now()
+        plan = None
+        
+        try:
+            # 1-5. Plan + stream MSSQL -> PostgreSQL lewat sync engine bersama
+            # (strategi dipilih planner, batch size adaptif + memory budget yang sama dengan scheduler)
+            logger.info(f"Manual sync via engine: {schema}.{table}")
+            success, message, records_count, plan = sync_engine.run_planned_sync(schema, table, 'manual_sync')
             
-            pg_cursor.close()
-            pg_conn.close()
+            if not success:
+                raise RuntimeError(message)
             
             # 6. Log to sync_logs
+            # (kalau menumpang sync yang sedang jalan, records sudah dicatat oleh run tersebut)
             duration = int((datetime.now() - start_time).total_seconds())
+            attached = plan.strategy == 'attached'
             DatabaseManager.execute_query(
                 """INSERT INTO public.sync_logs 
                    (schedule_name, sync_type, source_schema, source_table, target_schema, target_table, 
-                    records_synced, status, started_at, completed_at, duration_seconds)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                    records_synced, status, started_at, completed_at, duration_seconds,
+                    strategy, plan_reason, phase_timings, run_id)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
                 ('manual_sync', 'manual', schema, table, schema, table, 
-                 records_count, 'success', start_time, datetime.now(), duration)
+                 0 if attached else records_count, 'success', start_time, datetime.now(), duration,
+                 plan.strategy, plan.reason, Json(plan.phases) if plan.phases else None,
+                 get_log_context().get('run_id'))
             )
             
-            return (True, f"Berhasil sync {records_count} records dalam {duration}s", records_count)
+            if attached:
+                return (True, f"Sync tabel ini sedang berjalan, hasil diambil dari run tersebut: {message}", records_count)
+            
+            if plan.strategy == 'skip':
+                return (True, f"Dilewati, tidak ada perubahan: {plan.reason}", 0)
+            
+            # Incremental/change tracking dengan 0 baris = tidak ada perubahan, bukan tabel kosong
+            if records_count == 0 and plan.strategy not in ('incremental', 'change_tracking'):
+                return (True, "Tabel kosong, tidak ada data untuk disinkronkan", 0)
+            
+            return (True, f"Berhasil sync {records_count} records dalam {duration}s ({plan.strategy})", records_count)
             
         except Exception as e:
             logger.error(f"Manual sync error: {e}", exc_info=True)
@@ -228,17 +169,291 @@ class DatabaseManager:
                 DatabaseManager.execute_query(
                     """INSERT INTO public.sync_logs 
                        (schedule_name, sync_type, source_schema, source_table, target_schema, target_table, 
-                        records_synced, status, started_at, completed_at, error_message, duration_seconds)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                        records_synced, status, started_at, completed_at, error_message, duration_seconds,
+                        strategy, plan_reason, phase_timings, run_id)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
                     ('manual_sync', 'manual', schema, table, schema, table, 
-                     0, 'failed', start_time, datetime.now(), str(e), duration)
+                     0, sync_engine.run_status(False), start_time, datetime.now(), str(e), duration,
+                     plan.strategy if plan else None, plan.reason if plan else None,
+                     Json(plan.phases) if plan and plan.phases else None,
+                     get_log_context().get('run_id'))
                 )
             except:
                 pass
             
             return (False, f"Error: {str(e)}", 0)
+    
+    @staticmethod
+    def check_schedule_pushdown(schema, table, columns, row_filter):
+        """Validasi kolom/filter ke tabel sumber di MSSQL (TOP 0)"""
+        mssql_conn = sync_engine.get_mssql_connection()
+        try:
+            return check_pushdown(mssql_conn.cursor(), schema, table, columns, row_filter)
+        finally:
+            mssql_conn.close()
 
 # Bot Commands
+SCHEDULE_WRITE_RE = re.compile(r'\b(INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+public\.schedules\b', re.IGNORECASE)
+SCHEDULE_FILTER_KEYS = ('schema', 'status', 'name')
+
+
+def parse_schedule_filters(args):
+    """Ambil filter schema=, status=, name= (prefix) dari argumen command"""
+    filters = {}
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        key = key.lower()
+        if sep and key in SCHEDULE_FILTER_KEYS and value:
+            filters[key] = value
+    return filters
+
+
+def format_schedule_item(sched):
+    """Satu jadwal untuk /schedule"""
+    status_emoji = "✅" if sched['status'] == 'active' else "⏸" if sched['status'] == 'inactive' else "🔄"
+    sync_info = ""
+    if sched.get('sync_type') == 'single_table':
+        sync_info = f"\n   📊 {sched.get('source_schema')}.{sched.get('table_name')}"
+    elif sched.get('sync_type') == 'job_group':
+        sync_info = f"\n   🔗 {', '.join(sched.get('table_list') or [])}"
+    
+    text = f"{status_emoji} {sched['name']}{sync_info}\n"
+    if sched.get('recurring'):
+        next_run = sched['next_run'].strftime('%Y-%m-%d %H:%M') if sched.get('next_run') else '-'
+        text += f"   🔁 Cron: {sched['cron_expression']} (next: {next_run})\n"
+        if sched.get('spread_minutes'):
+            text += f"   ↔️ Window: {sched['spread_minutes']} menit\n"
+    else:
+        text += f"   📆 {sched['schedule_date']} ⏰ {sched['schedule_time']}\n"
+        text += f"   Cron: {sched['cron_expression']}\n"
+    if sched.get('column_list'):
+        text += f"   🎯 Kolom: {', '.join(sched['column_list'])}\n"
+    if sched.get('row_filter'):
+        text += f"   🔎 Filter: {sched['row_filter']}\n"
+    if sched.get('targets'):
+        text += f"   🎯 Target: {', '.join(sched['targets'])}\n"
+    text += f"   Status: {sched['status']}\n\n"
+    return text
+
+
+def format_info_item(sched):
+    """Satu jadwal aktif untuk /info"""
+    last_run = sched['last_run'].strftime('%Y-%m-%d %H:%M') if sched['last_run'] else 'Belum pernah'
+    sync_info = ""
+    if sched.get('sync_type') == 'single_table':
+        sync_info = f" ({sched.get('source_schema')}.{sched.get('table_name')})"
+    elif sched.get('sync_type') == 'job_group':
+        sync_info = f" (group: {len(sched.get('table_list') or [])} tabel)"
+    text = f"• {sched['name']}{sync_info}\n"
+    if sched.get('recurring'):
+        next_run = sched['next_run'].strftime('%Y-%m-%d %H:%M') if sched.get('next_run') else '-'
+        text += f"  🔁 {sched['cron_expression']} (next: {next_run})\n"
+    else:
+        text += f"  📅 {sched['schedule_date']} {sched['schedule_time']}\n"
+    text += f"  ⏱ Last run: {last_run}\n"
+    text += f"  ✅ Status: {sched['last_status'] or 'N/A'}\n"
+    if sched.get('last_message'):
+        # Escape special characters
+        msg = str(sched['last_message']).replace('_', ' ').replace('*', ' ')
+        text += f"  💬 {msg[:50]}\n"
+    return text + "\n"
+
+
+def format_recent_logs():
+    """Bagian "5 Log Terakhir" untuk /info"""
+    logs = DatabaseManager.execute_query(
+        """SELECT * FROM public.sync_logs 
+           ORDER BY started_at DESC LIMIT 5""",
+        fetch=True
+    )
+    text = "5 Log Terakhir:\n"
+    if not logs:
+        return text + "Belum ada log\n"
+    for log in logs:
+        status_emoji = "✅" if log['status'] == 'success' else "❌" if log['status'] == 'failed' else "⏳"
+        started = log['started_at'].strftime('%Y-%m-%d %H:%M:%S') if log['started_at'] else 'N/A'
+        table_info = ""
+        if log.get('source_table'):
+            table_info = f" ({log.get('source_schema')}.{log.get('source_table')})"
+        if log.get('target_db'):
+            table_info += f" → {log['target_db']}"
+        text += f"{status_emoji} {log['schedule_name']}{table_info} - {started}\n"
+        text += f"   Records: {log['records_synced']}, Duration: {log['duration_seconds']}s\n"
+    return text
+
+
+class SchedulePager:
+    """Halaman /schedule dan /info dengan keyset pagination + cache
+
+    Urutan pakai name COLLATE "C" (index schedules_name_c_idx dari scheduler),
+    jadi halaman berikut cukup "name > nama terakhir", tanpa OFFSET. Filter
+    schema/status/prefix nama dijalankan di SQL. Halaman yang sudah dirender
+    di-cache sampai TTL habis atau ada perubahan di public.schedules: tulis
+    lewat bot langsung invalidate, perubahan dari scheduler (status, last_run,
+    next_run) ketahuan dari versi MAX(updated_at) + COUNT(*) yang dicek
+    setiap render.
+    """
+    
+    VIEWS = {
+        'schedule': {'title': "📅 Daftar Jadwal Sinkronisasi\n\n", 'format': format_schedule_item,
+                     'empty': "Tidak ada jadwal tersimpan"},
+        'info': {'title': "📊 Status Sinkronisasi\n\nJadwal Aktif:\n", 'format': format_info_item,
+                 'empty': "Tidak ada jadwal aktif\n\n"},
+    }
+    MAX_STATES = 2000
+    
+    def __init__(self, page_size=None, ttl=None):
+        self.page_size = page_size or SCHEDULE_PAGE_SIZE
+        self.ttl = ttl or SCHEDULE_PAGE_CACHE_SECONDS
+        self.cache = {}
+        self.version = None
+        # Token callback_data -> state halaman (callback_data maks 64 byte)
+        self.states = OrderedDict()
+    
+    def invalidate(self):
+        self.cache.clear()
+    
+    def current_version(self):
+        """Versi murah public.schedules; berubah tiap ada update/insert/delete"""
+        rows = DatabaseManager.execute_query(
+            "SELECT MAX(updated_at) AS updated, COUNT(*) AS total FROM public.schedules",
+            fetch=True
+        )
+        return (str(rows[0]['updated']), rows[0]['total']) if rows else None
+    
+    def state_token(self, state):
+        token = hashlib.md5(json.dumps(state, sort_keys=True).encode()).hexdigest()[:16]
+        self.states[token] = state
+        self.states.move_to_end(token)
+        while len(self.states) > self.MAX_STATES:
+            self.states.popitem(last=False)
+        return token
+    
+    def fetch(self, filters, after=None, before=None):
+        """Ambil page_size + 1 baris (baris ekstra = masih ada halaman lain)"""
+        where, params = [], []
+        if filters.get('status'):
+            where.append("status = %s")
+            params.append(filters['status'])
+        if filters.get('schema'):
+            where.append(
+                "(source_schema = %s OR %s = ANY(SELECT split_part(t, '.', 1) FROM unnest(table_list) t))"
+            )
+            params += [filters['schema'], filters['schema']]
+        if filters.get('name'):
+            prefix = filters['name'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where.append('name COLLATE "C" LIKE %s')
+            params.append(prefix + '%')
+        if after is not None:
+            where.append('name COLLATE "C" > %s')
+            params.append(after)
+        if before is not None:
+            where.append('name COLLATE "C" < %s')
+            params.append(before)
+        
+        query = "SELECT * FROM public.schedules"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += ' ORDER BY name COLLATE "C"' + (" DESC" if before is not None else "")
+        query += " LIMIT %s"
+        params.append(self.page_size + 1)
+        
+        rows = DatabaseManager.execute_query(query, tuple(params), fetch=True) or []
+        return list(rows)
+    
+    def render(self, view, filters, after=None, before=None):
+        """Returns (text, reply_markup)"""
+        version = self.current_version()
+        if version != self.version:
+            self.cache.clear()
+            self.version = version
+        
+        key = (view, json.dumps(filters, sort_keys=True), after, before)
+        cached = self.cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        
+        page = self._render(view, filters, after, before)
+        self.cache[key] = (time.monotonic(), page)
+        return page
+    
+    def _render(self, view, filters, after, before):
+        spec = self.VIEWS[view]
+        if view == 'info':
+            filters = dict(filters, status='active')
+        
+        rows = self.fetch(filters, after, before)
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if before is not None:
+            rows.reverse()
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = after is not None, more
+        
+        header = spec['title']
+        shown = {k: v for k, v in filters.items() if not (view == 'info' and k == 'status')}
+        if shown:
+            header += "Filter: " + ", ".join(f"{k}={v}" for k, v in sorted(shown.items())) + "\n\n"
+        footer = "\n" + format_recent_logs() if view == 'info' else ""
+        
+        if not rows:
+            if view == 'schedule' and not (after or before or filters):
+                return spec['empty'], None
+            return header + spec['empty'] + footer, None
+        
+        # Isi halaman sampai batas pesan Telegram, sisanya ke halaman lain
+        budget = TELEGRAM_MAX_MESSAGE - len(header) - len(footer) - 50
+        blocks = [(sched['name'], spec['format'](sched)) for sched in rows]
+        if before is not None:
+            blocks.reverse()
+        kept, used = [], 0
+        for name, block in blocks:
+            if kept and used + len(block) > budget:
+                if before is not None:
+                    has_prev = True
+                else:
+                    has_next = True
+                break
+            kept.append((name, block[:budget]))
+            used += len(block)
+        if before is not None:
+            kept.reverse()
+        
+        text = header + "".join(block for _, block in kept) + footer
+        
+        buttons = []
+        base = {'view': view, 'filters': filters if view != 'info' else shown}
+        if has_prev:
+            token = self.state_token(dict(base, before=kept[0][0]))
+            buttons.append(InlineKeyboardButton("◀️ Sebelumnya", callback_data=f"pg:{token}"))
+        if has_next:
+            token = self.state_token(dict(base, after=kept[-1][0]))
+            buttons.append(InlineKeyboardButton("Berikutnya ▶️", callback_data=f"pg:{token}"))
+        
+        return text, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+schedule_pager = SchedulePager()
+
+async def schedule_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler tombol ◀️/▶️ di /schedule dan /info"""
+    query = update.callback_query
+    try:
+        state = schedule_pager.states.get(query.data.split(':', 1)[1])
+        if not state:
+            await query.answer("Halaman kedaluwarsa, jalankan command-nya lagi")
+            return
+        
+        text, markup = schedule_pager.render(
+            state['view'], state['filters'], state.get('after'), state.get('before'))
+        await query.answer()
+        await query.edit_message_text(text, reply_markup=markup)
+        
+    except Exception as e:
+        logger.error(f"Schedule page error: {e}")
+        await query.answer(f"Error: {str(e)}"[:200])
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk /start command"""
     welcome_message = """
@@ -249,17 +464,35 @@ Saya akan membantu Anda memonitor dan mengontrol sinkronisasi data dari MSSQL ke
 *Perintah yang tersedia:*
 
 📊 *Monitoring*
-/info - Status sinkronisasi terkini
+/info [schema=..] [name=prefix] - Status sinkronisasi terkini
 /info\_loop {menit} - Info berkala setiap N menit
 
 📅 *Schedule Management*
-/schedule - Lihat semua jadwal
+/schedule - Lihat semua jadwal (per halaman)
+/schedule list [schema=..] [status=..] [name=prefix] - Jadwal dengan filter
 📋 *Single Table Schedule*
 /schedule single add {nama} {schema} {table} {YYYY-MM-DD} {HH:MM}
 /schedule single delete {nama}
+🔗 *Job Group (urut FK, paralel per cabang)*
+/schedule group add {nama} {YYYY-MM-DD} {HH:MM} {schema.table} ...
+/schedule group delete {nama}
+🔁 *Jadwal Berulang (cron)*
+/schedule cron set {nama} {m} {h} {dom} {mon} {dow} [window\_menit]
+/schedule cron off {nama}
+🎯 *Kolom & Filter (dipush ke MSSQL)*
+/schedule columns {nama} {kol1,kol2,...|all}
+/schedule filter {nama} {kondisi WHERE|off}
+/schedule targets {nama} {main,reporting,...} - Multi target PostgreSQL
+🔬 *Profiling*
+/schedule profile {nama} {on|off}
+/schedule timeout {nama} {menit|off} - Batas waktu run
 
 🔄 *Manual Sync*
 /sync table {schema} {table} - Sync manual 1 tabel
+/sync table {schema} {table} --profile - Sync + ringkasan hot-spot
+/sync plan {schema} {table} - Lihat strategi sync (dry-run)
+/sync jobs - Sync yang sedang berjalan
+/sync cancel {run\_id|nama|schema.table} - Batalkan sync
 
 ⚙️ *Control*
 /restart bot - Restart bot ini
@@ -267,6 +500,9 @@ Saya akan membantu Anda memonitor dan mengontrol sinkronisasi data dari MSSQL ke
 
 *Contoh penggunaan:*
 `/schedule single add sync_customers ref customers 2025-11-20 03:00`
+`/schedule group add sync_sales 2025-11-20 02:00 ref.customers datamart.orders datamart.order_items`
+`/schedule cron set sync_customers 0 3 * * * 30`
+`/schedule filter sync_customers is_archived = 0`
 `/sync table datamart orders`
 `/sync table ref customers`
 `/info_loop 30`
@@ -274,86 +510,24 @@ Saya akan membantu Anda memonitor dan mengontrol sinkronisasi data dari MSSQL ke
     await update.message.reply_text(welcome_message, parse_mode='Markdown')
 
 async def info(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler untuk /info command"""
+    """Handler untuk /info [schema=..] [name=prefix]"""
     try:
-        schedules = DatabaseManager.execute_query(
-            "SELECT * FROM public.schedules WHERE status = 'active' ORDER BY schedule_date, schedule_time",
-            fetch=True
-        )
-        
-        logs = DatabaseManager.execute_query(
-            """SELECT * FROM public.sync_logs 
-               ORDER BY started_at DESC LIMIT 5""",
-            fetch=True
-        )
-        
-        # Build response - TANPA MARKDOWN
-        response = "📊 Status Sinkronisasi\n\n"
-        
-        response += "Jadwal Aktif:\n"
-        if schedules:
-            for sched in schedules:
-                last_run = sched['last_run'].strftime('%Y-%m-%d %H:%M') if sched['last_run'] else 'Belum pernah'
-                sync_info = ""
-                if sched.get('sync_type') == 'single_table':
-                    sync_info = f" ({sched.get('source_schema')}.{sched.get('table_name')})"
-                response += f"• {sched['name']}{sync_info}\n"
-                response += f"  📅 {sched['schedule_date']} {sched['schedule_time']}\n"
-                response += f"  ⏱ Last run: {last_run}\n"
-                response += f"  ✅ Status: {sched['last_status'] or 'N/A'}\n"
-                if sched.get('last_message'):
-                    # Escape special characters
-                    msg = str(sched['last_message']).replace('_', ' ').replace('*', ' ')
-                    response += f"  💬 {msg[:50]}\n"
-                response += "\n"
-        else:
-            response += "Tidak ada jadwal aktif\n\n"
-        
-        response += "5 Log Terakhir:\n"
-        if logs:
-            for log in logs:
-                status_emoji = "✅" if log['status'] == 'success' else "❌" if log['status'] == 'failed' else "⏳"
-                started = log['started_at'].strftime('%Y-%m-%d %H:%M:%S') if log['started_at'] else 'N/A'
-                table_info = ""
-                if log.get('source_table'):
-                    table_info = f" ({log.get('source_schema')}.{log.get('source_table')})"
-                response += f"{status_emoji} {log['schedule_name']}{table_info} - {started}\n"
-                response += f"   Records: {log['records_synced']}, Duration: {log['duration_seconds']}s\n"
-        else:
-            response += "Belum ada log\n"
+        filters = parse_schedule_filters(context.args or [])
+        text, markup = schedule_pager.render('info', filters)
         
         # Kirim TANPA parse_mode
-        await update.message.reply_text(response)
+        await update.message.reply_text(text, reply_markup=markup)
         
     except Exception as e:
         logger.error(f"Info error: {e}")
         await update.message.reply_text(f"Error: {str(e)}")
 
 async def schedule_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler untuk /schedule command"""
+    """Handler untuk /schedule [list] [schema=..] [status=..] [name=prefix]"""
     try:
-        schedules = DatabaseManager.execute_query(
-            "SELECT * FROM public.schedules ORDER BY schedule_date, schedule_time",
-            fetch=True
-        )
-        
-        if not schedules:
-            await update.message.reply_text("Tidak ada jadwal tersimpan")
-            return
-        
-        response = "📅 Daftar Jadwal Sinkronisasi\n\n"
-        for sched in schedules:
-            status_emoji = "✅" if sched['status'] == 'active' else "⏸" if sched['status'] == 'inactive' else "🔄"
-            sync_info = ""
-            if sched.get('sync_type') == 'single_table':
-                sync_info = f"\n   📊 {sched.get('source_schema')}.{sched.get('table_name')}"
-            
-            response += f"{status_emoji} {sched['name']}{sync_info}\n"
-            response += f"   📆 {sched['schedule_date']} ⏰ {sched['schedule_time']}\n"
-            response += f"   Cron: {sched['cron_expression']}\n"
-            response += f"   Status: {sched['status']}\n\n"
-        
-        await update.message.reply_text(response)
+        filters = parse_schedule_filters(context.args or [])
+        text, markup = schedule_pager.render('schedule', filters)
+        await update.message.reply_text(text, reply_markup=markup)
         
     except Exception as e:
         logger.error(f"Schedule list error: {e}")
@@ -503,31 +677,349 @@ async def schedule_single_add(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.error(f"Single add error: {e}")
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
+async def schedule_group_add(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule group add"""
+    try:
+        logger.info(f"Group add called with args: {context.args}")
+        
+        if len(context.args) < 6:
+            await update.message.reply_text(
+                "Format: /schedule group add {nama} {YYYY-MM-DD} {HH:MM} {schema.table} ...\n"
+                "Contoh: /schedule group add sync_sales 2025-11-20 02:00 ref.customers datamart.orders"
+            )
+            return
+        
+        name = context.args[2]
+        date = context.args[3]
+        time = context.args[4]
+        tables = parse_table_list(context.args[5:])
+        
+        for schema, table in tables:
+            if schema not in ['datamart', 'ref', 'public']:
+                await update.message.reply_text(
+                    f"Schema '{schema}' ({schema}.{table}) tidak valid. "
+                    "Schema hanya boleh 'datamart', 'ref', atau 'public'"
+                )
+                return
+        
+        datetime.strptime(date, '%Y-%m-%d')
+        datetime.strptime(time, '%H:%M')
+        
+        dt = datetime.strptime(f"{date} {time}", '%Y-%m-%d %H:%M')
+        cron = f"{dt.minute} {dt.hour} {dt.day} {dt.month} *"
+        
+        table_list = [f"{schema}.{table}" for schema, table in tables]
+        
+        DatabaseManager.execute_query(
+            """INSERT INTO public.schedules 
+               (name, sync_type, table_list, schedule_date, schedule_time, cron_expression, status)
+               VALUES (%s, 'job_group', %s, %s, %s, %s, 'active')""",
+            (name, table_list, date, time, cron)
+        )
+        
+        await update.message.reply_text(
+            f"✅ Job group '{name}' berhasil ditambahkan!\n"
+            f"🔗 {len(table_list)} tabel: {', '.join(table_list)}\n"
+            f"📅 {date} ⏰ {time}\n"
+            f"Urutan sync mengikuti foreign key di PostgreSQL"
+        )
+        
+    except Exception as e:
+        logger.error(f"Group add error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def schedule_cron_set(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule cron set - jadikan jadwal berulang"""
+    try:
+        logger.info(f"Cron set called with args: {context.args}")
+        
+        if len(context.args) < 8:
+            await update.message.reply_text(
+                "Format: /schedule cron set {nama} {m} {h} {dom} {mon} {dow} [window_menit]\n"
+                "Contoh: /schedule cron set sync_customers 0 3 * * * 30\n"
+                "window_menit: geser start dalam window ini ke slot yang paling sepi"
+            )
+            return
+        
+        name = context.args[2]
+        cron = CronExpression(' '.join(context.args[3:8]))
+        window = int(context.args[8]) if len(context.args) > 8 else 0
+        
+        if window < 0 or window > 720:
+            await update.message.reply_text("window_menit harus antara 0 dan 720")
+            return
+        
+        rows = DatabaseManager.execute_query(
+            "SELECT * FROM public.schedules WHERE name = %s",
+            (name,),
+            fetch=True
+        )
+        if not rows:
+            await update.message.reply_text(f"❌ Jadwal '{name}' tidak ditemukan")
+            return
+        
+        sched = dict(rows[0])
+        sched['cron_expression'] = str(cron)
+        sched['spread_minutes'] = window
+        next_run = await asyncio.to_thread(sync_engine.plan_next_run, sched)
+        
+        DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET cron_expression = %s, recurring = TRUE, spread_minutes = %s,
+                   next_run = %s, status = 'active', updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s""",
+            (str(cron), window, next_run, name)
+        )
+        
+        await update.message.reply_text(
+            f"✅ Jadwal '{name}' sekarang berulang\n"
+            f"🔁 Cron: {cron}\n"
+            f"↔️ Window: {window} menit\n"
+            f"⏭ Next run: {next_run.strftime('%Y-%m-%d %H:%M')}"
+        )
+        
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Cron tidak valid: {str(e)}")
+    except Exception as e:
+        logger.error(f"Cron set error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def schedule_cron_off(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule cron off - kembali ke jadwal sekali jalan"""
+    try:
+        if len(context.args) < 3:
+            await update.message.reply_text("Format: /schedule cron off {nama}")
+            return
+        
+        name = context.args[2]
+        
+        DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET recurring = FALSE, next_run = NULL, updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s""",
+            (name,)
+        )
+        
+        await update.message.reply_text(f"✅ Jadwal '{name}' tidak lagi berulang")
+        
+    except Exception as e:
+        logger.error(f"Cron off error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def get_single_schedule(update: Update, name):
+    """Ambil jadwal single_table by name, kirim pesan error kalau tidak ada"""
+    rows = DatabaseManager.execute_query(
+        "SELECT * FROM public.schedules WHERE name = %s",
+        (name,),
+        fetch=True
+    )
+    if not rows:
+        await update.message.reply_text(f"❌ Jadwal '{name}' tidak ditemukan")
+        return None
+    if rows[0].get('sync_type') != 'single_table':
+        await update.message.reply_text("❌ Kolom/filter hanya untuk jadwal single table")
+        return None
+    return rows[0]
+
+async def schedule_columns(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule columns {nama} {kol1,kol2,...|all}"""
+    try:
+        logger.info(f"Schedule columns called with args: {context.args}")
+        
+        if len(context.args) < 3:
+            await update.message.reply_text(
+                "Format: /schedule columns {nama} {kol1,kol2,...|all}\n"
+                "Contoh: /schedule columns sync_customers id,name,email,updated_at"
+            )
+            return
+        
+        name = context.args[1]
+        sched = await get_single_schedule(update, name)
+        if not sched:
+            return
+        
+        raw = ''.join(context.args[2:])
+        columns = None if raw.lower() == 'all' else raw.split(',')
+        
+        columns, _ = await asyncio.to_thread(
+            DatabaseManager.check_schedule_pushdown,
+            sched['source_schema'], sched['table_name'], columns, sched.get('row_filter')
+        )
+        
+        DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET column_list = %s, updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s""",
+            (columns, name)
+        )
+        
+        if columns:
+            await update.message.reply_text(f"✅ Jadwal '{name}' hanya mengambil kolom: {', '.join(columns)}")
+        else:
+            await update.message.reply_text(f"✅ Jadwal '{name}' mengambil semua kolom")
+        
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Kolom tidak valid: {str(e)}")
+    except Exception as e:
+        logger.error(f"Schedule columns error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def schedule_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule filter {nama} {kondisi WHERE|off}"""
+    try:
+        logger.info(f"Schedule filter called with args: {context.args}")
+        
+        if len(context.args) < 3:
+            await update.message.reply_text(
+                "Format: /schedule filter {nama} {kondisi WHERE|off}\n"
+                "Contoh: /schedule filter sync_orders order_date >= DATEADD(day, -90, GETDATE())"
+            )
+            return
+        
+        name = context.args[1]
+        sched = await get_single_schedule(update, name)
+        if not sched:
+            return
+        
+        predicate = ' '.join(context.args[2:])
+        row_filter = None if predicate.lower() == 'off' else predicate
+        
+        _, row_filter = await asyncio.to_thread(
+            DatabaseManager.check_schedule_pushdown,
+            sched['source_schema'], sched['table_name'], sched.get('column_list'), row_filter
+        )
+        
+        DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET row_filter = %s, updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s""",
+            (row_filter, name)
+        )
+        
+        if row_filter:
+            await update.message.reply_text(f"✅ Filter jadwal '{name}': WHERE {row_filter}")
+        else:
+            await update.message.reply_text(f"✅ Filter jadwal '{name}' dihapus")
+        
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Filter tidak valid: {str(e)}")
+    except Exception as e:
+        logger.error(f"Schedule filter error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def schedule_targets(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule targets {nama} {target1,target2,...|main}"""
+    try:
+        logger.info(f"Schedule targets called with args: {context.args}")
+        
+        if len(context.args) < 3:
+            await update.message.reply_text(
+                "Format: /schedule targets {nama} {target1,target2,...|main}\n"
+                f"Target tersedia: {', '.join(known_targets())}\n"
+                "Contoh: /schedule targets sync_customers main,reporting,sandbox"
+            )
+            return
+        
+        name = context.args[1]
+        sched = await get_single_schedule(update, name)
+        if not sched:
+            return
+        
+        targets = validate_targets(' '.join(context.args[2:]).split(','))
+        # Hanya main = perilaku lama (planner: skip/incremental/partitioned)
+        stored = None if targets == ['main'] else targets
+        
+        DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET targets = %s, updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s""",
+            (stored, name)
+        )
+        
+        if stored:
+            await update.message.reply_text(
+                f"✅ Jadwal '{name}' sync ke: {', '.join(targets)}\n"
+                f"(1x extract dari MSSQL, full reload ke semua target)"
+            )
+        else:
+            await update.message.reply_text(f"✅ Jadwal '{name}' sync ke main saja")
+        
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Target tidak valid: {str(e)}")
+    except Exception as e:
+        logger.error(f"Schedule targets error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def schedule_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule profile {nama} {on|off}"""
+    try:
+        logger.info(f"Schedule profile called with args: {context.args}")
+        
+        if len(context.args) < 3 or context.args[2].lower() not in ('on', 'off'):
+            await update.message.reply_text(
+                "Format: /schedule profile {nama} {on|off}\n"
+                "Contoh: /schedule profile sync_orders on"
+            )
+            return
+        
+        name = context.args[1]
+        enabled = context.args[2].lower() == 'on'
+        
+        rows = DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET profile = %s, updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s
+               RETURNING name""",
+            (enabled, name),
+            fetch=True
+        )
+        
+        if not rows:
+            await update.message.reply_text(f"❌ Jadwal '{name}' tidak ditemukan")
+            return
+        
+        if enabled:
+            await update.message.reply_text(
+                f"✅ Setiap run jadwal '{name}' akan diprofile (cProfile + tracemalloc) sampai dimatikan\n"
+                f"Hasil: tabel public.sync_profiles, run_id sama dengan sync_logs"
+            )
+        else:
+            await update.message.reply_text(f"✅ Profiling jadwal '{name}' dimatikan")
+        
+    except Exception as e:
+        logger.error(f"Schedule profile error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
 async def manual_sync_table(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handler untuk /sync table {schema} {table}"""
+    """Handler untuk /sync table {schema} {table} [--profile]"""
     try:
         logger.info(f"Manual sync table called with args: {context.args}")
         
-        if len(context.args) < 3:
+        args = [arg for arg in context.args if arg.lower() != '--profile']
+        profile = len(args) != len(context.args)
+        
+        if len(args) < 3:
             await update.message.reply_text(
-                "Format: /sync table {schema} {table}\n\n"
+                "Format: /sync table {schema} {table} [--profile]\n\n"
                 "Contoh:\n"
                 "/sync table datamart orders\n"
-                "/sync table ref customers"
+                "/sync table ref customers --profile"
             )
             return
         
-        schema = context.args[1]
-        table = context.args[2]
+        schema = args[1]
+        table = args[2]
         
         if schema not in ['datamart', 'ref', 'public']:
             await update.message.reply_text("Schema hanya boleh 'datamart', 'ref', atau 'public'")
             return
         
+        profile_note = "🔬 Profiling aktif\n" if profile else ""
         processing_msg = await update.message.reply_text(
             f"🔄 Memulai sinkronisasi manual...\n"
             f"📊 Schema: {schema}\n"
-            f"📋 Table: {table}\n\n"
+            f"📋 Table: {table}\n"
+            f"{profile_note}\n"
             f"Mohon tunggu..."
         )
         
@@ -535,7 +1027,8 @@ async def manual_sync_table(update: Update, context: ContextTypes.DEFAULT_TYPE):
         result = await asyncio.to_thread(
             DatabaseManager.manual_sync_table, 
             schema, 
-            table
+            table,
+            profile
         )
         
         success = result[0]
@@ -562,6 +1055,153 @@ async def manual_sync_table(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Manual sync table handler error: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Error: {str(e)}")
 
+async def sync_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /sync cancel {run_id|nama jadwal|schema.table}"""
+    try:
+        logger.info(f"Sync cancel called with args: {context.args}")
+        
+        if len(context.args) < 2:
+            await update.message.reply_text(
+                "Format: /sync cancel {run_id|nama jadwal|schema.table}\n"
+                "Lihat job yang sedang jalan: /sync jobs"
+            )
+            return
+        
+        job = context.args[1]
+        user = update.effective_user.username if update.effective_user else None
+        
+        conn = sync_engine.get_pg_connection()
+        try:
+            rows = request_cancel(conn, job, f"dibatalkan oleh {user or 'bot'}")
+        finally:
+            conn.close()
+        
+        if not rows:
+            await update.message.reply_text(f"❌ Tidak ada job berjalan yang cocok dengan '{job}'")
+            return
+        
+        response = "⏹ Pembatalan dikirim, job berhenti di batch berikutnya:\n"
+        for run_id, schedule_name, target in rows:
+            response += f"• {schedule_name} ({target}) run {run_id}\n"
+        await update.message.reply_text(response)
+        
+    except Exception as e:
+        logger.error(f"Sync cancel error: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def sync_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /sync jobs - daftar sync yang sedang berjalan"""
+    try:
+        # Buang job dari proses yang sudah mati (tidak ada heartbeat)
+        conn = sync_engine.get_pg_connection()
+        try:
+            prune_stale_jobs(conn)
+        finally:
+            conn.close()
+        
+        jobs = DatabaseManager.execute_query(
+            """SELECT run_id, schedule_name, target, started_at, deadline, cancel_requested
+               FROM public.sync_jobs ORDER BY started_at""",
+            fetch=True
+        )
+        
+        if not jobs:
+            await update.message.reply_text("Tidak ada sync yang sedang berjalan")
+            return
+        
+        response = "🏃 Sync yang sedang berjalan\n\n"
+        for job in jobs:
+            response += f"• {job['schedule_name']} ({job['target']})\n"
+            response += f"  run: {job['run_id']}, mulai: {job['started_at']:%Y-%m-%d %H:%M:%S}\n"
+            if job['deadline']:
+                response += f"  batas waktu: {job['deadline']:%H:%M:%S}\n"
+            if job['cancel_requested']:
+                response += "  ⏹ sedang dibatalkan\n"
+        await update.message.reply_text(response[:TELEGRAM_MAX_MESSAGE])
+        
+    except Exception as e:
+        logger.error(f"Sync jobs error: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def schedule_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /schedule timeout {nama} {menit|off}"""
+    try:
+        logger.info(f"Schedule timeout called with args: {context.args}")
+        
+        value = context.args[2].lower() if len(context.args) >= 3 else ''
+        if not (value == 'off' or (value.isdigit() and int(value) > 0)):
+            await update.message.reply_text(
+                "Format: /schedule timeout {nama} {menit|off}\n"
+                "Contoh: /schedule timeout sync_orders 90"
+            )
+            return
+        
+        name = context.args[1]
+        minutes = None if value == 'off' else int(value)
+        
+        rows = DatabaseManager.execute_query(
+            """UPDATE public.schedules 
+               SET max_runtime_minutes = %s, updated_at = CURRENT_TIMESTAMP
+               WHERE name = %s
+               RETURNING name""",
+            (minutes, name),
+            fetch=True
+        )
+        
+        if not rows:
+            await update.message.reply_text(f"❌ Jadwal '{name}' tidak ditemukan")
+            return
+        
+        if minutes:
+            await update.message.reply_text(f"✅ Jadwal '{name}' dibatalkan otomatis setelah {minutes} menit")
+        else:
+            await update.message.reply_text(f"✅ Batas waktu jadwal '{name}' dihapus")
+        
+    except Exception as e:
+        logger.error(f"Schedule timeout error: {e}")
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
+async def sync_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler untuk /sync plan {schema} {table} - dry-run planner"""
+    try:
+        logger.info(f"Sync plan called with args: {context.args}")
+        
+        if len(context.args) < 3:
+            await update.message.reply_text(
+                "Format: /sync plan {schema} {table}\n"
+                "Contoh: /sync plan datamart orders"
+            )
+            return
+        
+        schema = context.args[1]
+        table = context.args[2]
+        
+        if schema not in ['datamart', 'ref', 'public']:
+            await update.message.reply_text("Schema hanya boleh 'datamart', 'ref', atau 'public'")
+            return
+        
+        # Pakai kolom/filter jadwal kalau tabel ini punya jadwal single table
+        rows = DatabaseManager.execute_query(
+            """SELECT column_list, row_filter FROM public.schedules
+               WHERE sync_type = 'single_table' AND source_schema = %s AND table_name = %s
+               LIMIT 1""",
+            (schema, table),
+            fetch=True
+        )
+        columns = rows[0]['column_list'] if rows else None
+        row_filter = rows[0]['row_filter'] if rows else None
+        
+        plan = await asyncio.to_thread(sync_engine.make_plan, schema, table, columns, row_filter)
+        
+        await update.message.reply_text(
+            f"🧭 Rencana sync {schema}.{table} (dry-run)\n\n"
+            f"{plan.describe()}"
+        )
+        
+    except Exception as e:
+        logger.error(f"Sync plan error: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Error: {str(e)}")
+
 
 async def info_loop_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler untuk /info_loop"""
@@ -627,6 +1267,7 @@ def main():
     application.add_handler(CommandHandler("info", info))
     application.add_handler(CommandHandler("restart", restart_bot))
     application.add_handler(CommandHandler("info_loop", info_loop_start))
+    application.add_handler(CallbackQueryHandler(schedule_page_callback, pattern=r'^pg:'))
     
     async def sync_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Router untuk sync commands"""
@@ -644,8 +1285,15 @@ def main():
             
             if action == "table":
                 await manual_sync_table(update, context)
+            elif action == "plan":
+                await sync_plan(update, context)
+            elif action == "cancel":
+                await sync_cancel(update, context)
+            elif action == "jobs":
+                await sync_jobs(update, context)
             else:
-                await update.message.reply_text("Command tidak dikenal. Gunakan: /sync table {schema} {table}")
+                await update.message.reply_text(
+                    "Command tidak dikenal. Gunakan: /sync table|plan {schema} {table}, /sync cancel {job}, /sync jobs")
                 
         except Exception as e:
             logger.error(f"Sync router error: {e}")
@@ -696,6 +1344,51 @@ def main():
                 else:
                     await update.message.reply_text("Subcommand tidak dikenal. Gunakan: add, delete")
             
+            elif action == "columns":
+                await schedule_columns(update, context)
+            
+            elif action == "filter":
+                await schedule_filter(update, context)
+            
+            elif action == "profile":
+                await schedule_profile(update, context)
+            
+            elif action == "timeout":
+                await schedule_timeout(update, context)
+            
+            elif action == "targets":
+                await schedule_targets(update, context)
+            
+            elif action == "cron":
+                if len(context.args) < 2:
+                    await update.message.reply_text("Format: /schedule cron set/off")
+                    return
+                    
+                subaction = context.args[1].lower()
+                logger.info(f"Schedule cron subaction: {subaction}")
+                
+                if subaction == "set":
+                    await schedule_cron_set(update, context)
+                elif subaction == "off":
+                    await schedule_cron_off(update, context)
+                else:
+                    await update.message.reply_text("Subcommand tidak dikenal. Gunakan: set, off")
+            
+            elif action == "group":
+                if len(context.args) < 2:
+                    await update.message.reply_text("Format: /schedule group add/delete")
+                    return
+                    
+                subaction = context.args[1].lower()
+                logger.info(f"Schedule group subaction: {subaction}")
+                
+                if subaction == "add":
+                    await schedule_group_add(update, context)
+                elif subaction == "delete":
+                    await schedule_delete(update, context)
+                else:
+                    await update.message.reply_text("Subcommand tidak dikenal. Gunakan: add, delete")
+            
             else:
                 await schedule_list(update, context)
                 
@@ -0,0 +1,205 @@
+"""
+Index and trigger management around full reloads.
+
+Before the first row is inserted, non-unique secondary indexes are dropped
+and user triggers are disabled. After the load the indexes are rebuilt in
+parallel (one connection each), triggers are re-enabled and the table is
+ANALYZEd, optionally VACUUMed. Every step is timed into a dict that ends up
+in the run's sync_logs row.
+
+Index definitions are written to public.sync_deferred_objects before they
+are dropped. If a run dies in between, the next full reload of the same
+table picks the leftovers up and rebuilds them.
+"""
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+SYNC_DEFER_INDEXES = os.getenv('SYNC_DEFER_INDEXES', 'true').lower() == 'true'
+SYNC_DISABLE_TRIGGERS = os.getenv('SYNC_DISABLE_TRIGGERS', 'true').lower() == 'true'
+SYNC_VACUUM_AFTER_LOAD = os.getenv('SYNC_VACUUM_AFTER_LOAD', 'false').lower() == 'true'
+SYNC_INDEX_WORKERS = int(os.getenv('SYNC_INDEX_WORKERS', '4'))
+
+DEFERRED_OBJECTS_DDL = """CREATE TABLE IF NOT EXISTS public.sync_deferred_objects (
+           target_schema TEXT NOT NULL,
+           target_table TEXT NOT NULL,
+           kind TEXT NOT NULL,
+           name TEXT NOT NULL,
+           definition TEXT,
+           created_at TIMESTAMP DEFAULT NOW(),
+           PRIMARY KEY (target_schema, target_table, kind, name)
+       )"""
+
+logger = logging.getLogger(__name__)
+
+
+class LoadPhase:
+    """Defer indexes/triggers for one full reload, then rebuild and analyze"""
+
+    def __init__(self, pg_connect, schema, table, timings, label=None):
+        self.pg_connect = pg_connect
+        self.schema = schema
+        self.table = table
+        self.timings = timings
+        self.label = label or f"{schema}.{table}"
+        self.prepared = False
+        self.finished = False
+
+    def _timed(self, step, fn, *args):
+        started = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            self.timings[step] = round(time.monotonic() - started, 3)
+
+    def prepare(self):
+        """Drop secondary indexes and disable user triggers (committed right away)"""
+        conn = self.pg_connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT kind, name FROM public.sync_deferred_objects
+                   WHERE target_schema = %s AND target_table = %s""",
+                (self.schema, self.table)
+            )
+            leftovers = cursor.fetchall()
+            if leftovers:
+                # finish() rebuilds everything recorded for the table, these included
+                logger.warning(f"[{self.label}] Objects left by an interrupted load, "
+                               f"restored after this load: {leftovers}")
+
+            if SYNC_DEFER_INDEXES:
+                self._timed('drop_indexes', self._drop_indexes, conn)
+            if SYNC_DISABLE_TRIGGERS:
+                self._timed('disable_triggers', self._disable_triggers, conn)
+            cursor.close()
+        finally:
+            conn.close()
+        self.prepared = True
+
+    def _drop_indexes(self, conn):
+        cursor = conn.cursor()
+        # Non-unique indexes that don't back a constraint (PK/unique/FK targets stay)
+        cursor.execute(
+            """SELECT n.nspname, c.relname, pg_get_indexdef(i.indexrelid)
+               FROM pg_index i
+               JOIN pg_class c ON c.oid = i.indexrelid
+               JOIN pg_namespace n ON n.oid = c.relnamespace
+               WHERE i.indrelid = to_regclass(%s)
+                 AND NOT i.indisunique
+                 AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)""",
+            (f"{self.schema}.{self.table}",)
+        )
+        indexes = cursor.fetchall()
+        for index_schema, index_name, definition in indexes:
+            cursor.execute(
+                """INSERT INTO public.sync_deferred_objects
+                   (target_schema, target_table, kind, name, definition)
+                   VALUES (%s, %s, 'index', %s, %s)
+                   ON CONFLICT DO NOTHING""",
+                (self.schema, self.table, index_name, definition)
+            )
+            cursor.execute(f'DROP INDEX "{index_schema}"."{index_name}"')
+        conn.commit()
+        cursor.close()
+        if indexes:
+            logger.info(f"[{self.label}] Deferred {len(indexes)} index(es)")
+
+    def _disable_triggers(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO public.sync_deferred_objects
+               (target_schema, target_table, kind, name)
+               VALUES (%s, %s, 'triggers', 'USER')
+               ON CONFLICT DO NOTHING""",
+            (self.schema, self.table)
+        )
+        cursor.execute(f"ALTER TABLE {self.schema}.{self.table} DISABLE TRIGGER USER")
+        conn.commit()
+        cursor.close()
+
+    def finish(self, vacuum=None):
+        """Rebuild deferred indexes in parallel, enable triggers, ANALYZE (+ VACUUM)
+
+        Also called after a failed load so the table isn't left without its
+        indexes and triggers. Triggers are re-enabled even if an index
+        rebuild fails; indexes that failed stay in sync_deferred_objects for
+        the next attempt, and finished is only set once everything succeeded.
+        """
+        vacuum = SYNC_VACUUM_AFTER_LOAD if vacuum is None else vacuum
+
+        conn = self.pg_connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT kind, name, definition FROM public.sync_deferred_objects
+                   WHERE target_schema = %s AND target_table = %s""",
+                (self.schema, self.table)
+            )
+            deferred = cursor.fetchall()
+            cursor.close()
+
+            indexes = [(name, definition) for kind, name, definition in deferred if kind == 'index']
+            try:
+                if indexes:
+                    self._timed('rebuild_indexes', self._rebuild_indexes, indexes)
+            finally:
+                if any(kind == 'triggers' for kind, _, _ in deferred):
+                    self._timed('enable_triggers', self._enable_triggers, conn)
+
+            # ANALYZE/VACUUM can't run inside a transaction block
+            conn.autocommit = True
+            cursor = conn.cursor()
+            self._timed('analyze', cursor.execute, f"ANALYZE {self.schema}.{self.table}")
+            if vacuum:
+                self._timed('vacuum', cursor.execute, f"VACUUM {self.schema}.{self.table}")
+            cursor.close()
+        finally:
+            conn.close()
+
+        self.finished = True
+        logger.info(f"[{self.label}] Load phase timings: {self.timings}")
+
+    def _rebuild_one(self, name, definition):
+        conn = self.pg_connect()
+        try:
+            cursor = conn.cursor()
+            # Someone may have recreated it by hand since the drop
+            cursor.execute(definition.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1))
+            cursor.execute(
+                """DELETE FROM public.sync_deferred_objects
+                   WHERE target_schema = %s AND target_table = %s AND kind = 'index' AND name = %s""",
+                (self.schema, self.table, name)
+            )
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    def _rebuild_indexes(self, indexes):
+        workers = max(1, min(SYNC_INDEX_WORKERS, len(indexes)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self._rebuild_one, name, definition)
+                       for name, definition in indexes]
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(str(e))
+        if errors:
+            raise RuntimeError(f"Index rebuild failed: {'; '.join(errors)}")
+        logger.info(f"[{self.label}] Rebuilt {len(indexes)} index(es)")
+
+    def _enable_triggers(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE {self.schema}.{self.table} ENABLE TRIGGER USER")
+        cursor.execute(
+            """DELETE FROM public.sync_deferred_objects
+               WHERE target_schema = %s AND target_table = %s AND kind = 'triggers'""",
+            (self.schema, self.table)
+        )
+        conn.commit()
+        cursor.close()
@@ -0,0 +1,276 @@
+"""
+Cooperative cancellation and maximum runtime for running syncs.
+
+Every schedule run and manual sync registers itself in public.sync_jobs
+while it runs (JobWatch). A watcher thread polls that row; when someone
+sets cancel_requested (bot: /sync cancel) or the run passes its deadline
+(schedules.max_runtime_minutes), the run's CancelToken fires:
+
+  - statements in flight are cancelled: connection.cancel() for every open
+    PostgreSQL connection of the run, cursor.cancel() for MSSQL cursors
+  - copy_rows() checks the token before each batch and raises
+    SyncCancelled, so the sync stops at a chunk boundary and the normal
+    error path closes its connections and restores deferred indexes
+
+The token lives in a ContextVar, so pool workers started with
+contextvars.copy_context() (partitions, job group members) share it.
+
+Each poll also stamps heartbeat_at. A process that crashed or was killed
+never deletes its row, so rows without a heartbeat for
+SYNC_JOB_STALE_SECONDS are ignored by request_cancel() and removed by
+prune_stale_jobs() (scheduler ensure_schema, bot /sync jobs).
+"""
+import os
+import socket
+import logging
+import threading
+import contextvars
+from datetime import datetime, timedelta
+
+SYNC_CANCEL_POLL_SECONDS = float(os.getenv('SYNC_CANCEL_POLL_SECONDS', '2'))
+# Default for schedules without max_runtime_minutes, 0 = no limit
+SYNC_MAX_RUNTIME_MINUTES = int(os.getenv('SYNC_MAX_RUNTIME_MINUTES', '0'))
+# A job whose watcher hasn't checked in for this long is considered dead
+SYNC_JOB_STALE_SECONDS = float(os.getenv('SYNC_JOB_STALE_SECONDS', '120'))
+
+SYNC_JOBS_DDL = """CREATE TABLE IF NOT EXISTS public.sync_jobs (
+           run_id TEXT PRIMARY KEY,
+           schedule_name TEXT,
+           target TEXT,
+           host TEXT,
+           pid INTEGER,
+           started_at TIMESTAMP DEFAULT NOW(),
+           deadline TIMESTAMP,
+           cancel_requested BOOLEAN DEFAULT FALSE,
+           cancel_reason TEXT,
+           heartbeat_at TIMESTAMP DEFAULT NOW()
+       )"""
+
+logger = logging.getLogger(__name__)
+
+_token = contextvars.ContextVar('sync_cancel_token', default=None)
+
+
+class SyncCancelled(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Cancelled: {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """Cancellation state of one run plus the connections it has open"""
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._pg_conns = []
+        self._mssql_cursors = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def remaining_seconds(self):
+        if self.deadline is None:
+            return None
+        return (self.deadline - datetime.now()).total_seconds()
+
+    def track_pg(self, conn):
+        with self._lock:
+            self._pg_conns = [c for c in self._pg_conns if not c.closed]
+            self._pg_conns.append(conn)
+
+    def track_mssql(self, cursor):
+        with self._lock:
+            self._mssql_cursors.append(cursor)
+
+    def cancel(self, reason):
+        """Fire once: mark cancelled and interrupt running statements"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            pg_conns = [c for c in self._pg_conns if not c.closed]
+            cursors = list(self._mssql_cursors)
+
+        logger.warning(f"Cancelling run: {reason} ({len(pg_conns)} PG connection(s), "
+                       f"{len(cursors)} MSSQL cursor(s))")
+        for conn in pg_conns:
+            try:
+                conn.cancel()
+            except Exception as e:
+                logger.debug(f"PG cancel failed: {e}")
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                logger.debug(f"MSSQL cancel failed: {e}")
+
+    def check(self):
+        if self._event.is_set():
+            raise SyncCancelled(self.reason)
+
+
+def current_token():
+    return _token.get()
+
+
+def check_cancelled():
+    """Raise SyncCancelled if the current run was cancelled (chunk boundary)"""
+    token = _token.get()
+    if token is not None:
+        token.check()
+
+
+def track_pg(conn):
+    """Register a PostgreSQL connection with the current run, returns it"""
+    token = _token.get()
+    if token is not None:
+        token.track_pg(conn)
+    return conn
+
+
+def track_mssql(cursor):
+    """Register an MSSQL cursor with the current run, returns it"""
+    token = _token.get()
+    if token is not None:
+        token.track_mssql(cursor)
+    return cursor
+
+
+def request_cancel(pg_conn, job, reason):
+    """Flag running jobs matching run_id / schedule name / schema.table, returns them"""
+    cursor = pg_conn.cursor()
+    cursor.execute(
+        """UPDATE public.sync_jobs
+           SET cancel_requested = TRUE, cancel_reason = %s
+           WHERE NOT cancel_requested
+             AND heartbeat_at > NOW() - make_interval(secs => %s)
+             AND (run_id = %s OR schedule_name = %s
+                  OR lower(%s) = ANY(string_to_array(target, ',')))
+           RETURNING run_id, schedule_name, target""",
+        (reason, SYNC_JOB_STALE_SECONDS, job, job, job)
+    )
+    rows = cursor.fetchall()
+    pg_conn.commit()
+    cursor.close()
+    return rows
+
+
+def prune_stale_jobs(pg_conn):
+    """Delete sync_jobs rows of runs that stopped heartbeating, returns them"""
+    cursor = pg_conn.cursor()
+    cursor.execute(
+        """DELETE FROM public.sync_jobs
+           WHERE COALESCE(heartbeat_at, started_at) < NOW() - make_interval(secs => %s)
+           RETURNING run_id, schedule_name, host, pid""",
+        (SYNC_JOB_STALE_SECONDS,)
+    )
+    rows = cursor.fetchall()
+    pg_conn.commit()
+    cursor.close()
+    if rows:
+        logger.warning(f"Removed {len(rows)} stale job(s): "
+                       f"{', '.join(f'{r[1]} run {r[0]} ({r[2]}:{r[3]})' for r in rows)}")
+    return rows
+
+
+class JobWatch:
+    """Register a run in sync_jobs and cancel it on request or at its deadline"""
+
+    def __init__(self, pg_connect, run_id, schedule_name, target, max_runtime_minutes=None):
+        self.pg_connect = pg_connect
+        self.run_id = run_id
+        self.schedule_name = schedule_name
+        self.target = target.lower() if target else None
+        minutes = max_runtime_minutes if max_runtime_minutes is not None else SYNC_MAX_RUNTIME_MINUTES
+        self.max_runtime_minutes = minutes or None
+        self.token = None
+        self._conn = None
+        self._ctx_token = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def cancelled(self):
+        return self.token is not None and self.token.cancelled
+
+    @property
+    def reason(self):
+        return self.token.reason if self.token else None
+
+    def __enter__(self):
+        deadline = None
+        if self.max_runtime_minutes:
+            deadline = datetime.now() + timedelta(minutes=self.max_runtime_minutes)
+        self.token = CancelToken(deadline)
+
+        # Own connection, opened before the token is set so it is never cancelled
+        self._conn = self.pg_connect()
+        self._conn.autocommit = True
+        self._register()
+
+        self._ctx_token = _token.set(self.token)
+        self._thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(self._watch,),
+            name=f"job-watch-{self.run_id}", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def _register(self):
+        cursor = self._conn.cursor()
+        cursor.execute(
+            """INSERT INTO public.sync_jobs (run_id, schedule_name, target, host, pid, deadline)
+               VALUES (%s, %s, %s, %s, %s, %s)
+               ON CONFLICT (run_id) DO NOTHING""",
+            (self.run_id, self.schedule_name, self.target, socket.gethostname(), os.getpid(),
+             self.token.deadline)
+        )
+        cursor.close()
+
+    def _watch(self):
+        """Heartbeat until the run exits; cancelling doesn't stop the heartbeat
+
+        A cancelled run still has to unwind (rollback, restoring indexes),
+        possibly for longer than SYNC_JOB_STALE_SECONDS. Without heartbeats
+        it would be pruned as stale and the table offered to a new run.
+        """
+        while not self._stop.wait(SYNC_CANCEL_POLL_SECONDS):
+            remaining = self.token.remaining_seconds()
+            if not self.token.cancelled and remaining is not None and remaining <= 0:
+                self.token.cancel(f"max runtime of {self.max_runtime_minutes} min exceeded")
+            try:
+                cursor = self._conn.cursor()
+                cursor.execute(
+                    """UPDATE public.sync_jobs SET heartbeat_at = NOW() WHERE run_id = %s
+                       RETURNING cancel_requested, cancel_reason""",
+                    (self.run_id,)
+                )
+                row = cursor.fetchone()
+                cursor.close()
+                if row is None:
+                    # Pruned as stale while the poll was failing (e.g. DB outage)
+                    self._register()
+            except Exception as e:
+                logger.error(f"[{self.schedule_name}] Cancel poll failed: {e}")
+                continue
+            if row and row[0] and not self.token.cancelled:
+                self.token.cancel(row[1] or "cancel requested")
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        _token.reset(self._ctx_token)
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute("DELETE FROM public.sync_jobs WHERE run_id = %s", (self.run_id,))
+            cursor.close()
+        except Exception as e:
+            logger.error(f"[{self.schedule_name}] Error unregistering job: {e}")
+        finally:
+            self._conn.close()
+        return False
@@ -0,0 +1,161 @@
+"""
+Cron expressions for recurring schedules.
+
+Standard 5-field syntax (minute hour day-of-month month day-of-week) with
+'*', lists, ranges, steps and month/day names. next_fire() jumps field by
+field (month -> day -> hour -> minute) instead of scanning every minute.
+
+spread_start() picks the start time inside a window after the nominal fire
+time that overlaps least with other planned runs, so schedules that all say
+"0 3 * * *" don't hit both databases at the same moment.
+"""
+import hashlib
+from datetime import datetime, timedelta
+
+MONTH_NAMES = {name: i + 1 for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'])}
+DAY_NAMES = {name: i for i, name in enumerate(
+    ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+# (min, max, names) per field
+FIELDS = [
+    (0, 59, {}),
+    (0, 23, {}),
+    (1, 31, {}),
+    (1, 12, MONTH_NAMES),
+    (0, 7, DAY_NAMES),
+]
+
+# Give up looking for a fire time after this many years (e.g. "0 0 30 2 *")
+MAX_YEARS = 5
+
+
+def _parse_value(value, names):
+    value = value.lower()
+    if value in names:
+        return names[value]
+    return int(value)
+
+
+def _parse_field(text, low, high, names):
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid step in '{text}'")
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = _parse_value(start_text, names), _parse_value(end_text, names)
+        else:
+            start = _parse_value(part, names)
+            # "5/15" means 5, 20, 35, 50
+            end = high if step > 1 else start
+
+        if start < low or end > high or start > end:
+            raise ValueError(f"Value out of range in '{text}' ({low}-{high})")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    """Parsed 5-field cron expression"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {len(fields)}: '{expression}'")
+
+        self.expression = ' '.join(fields)
+        parsed = [_parse_field(text, low, high, names)
+                  for text, (low, high, names) in zip(fields, FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        # 7 is Sunday too; cron weekday 0 = Sunday, Python weekday 6 = Sunday
+        self.weekdays = {(d % 7 - 1) % 7 for d in weekdays}
+        # Classic cron: if both day fields are restricted, either may match
+        self.dom_any = fields[2] == '*'
+        self.dow_any = fields[4] == '*'
+
+    def __str__(self):
+        return self.expression
+
+    def _day_matches(self, dt):
+        dom = dt.day in self.days
+        dow = dt.weekday() in self.weekdays
+        if self.dom_any and self.dow_any:
+            return True
+        if self.dom_any:
+            return dow
+        if self.dow_any:
+            return dom
+        return dom or dow
+
+    def next_fire(self, after):
+        """First fire time strictly after `after` (naive datetime, minute precision)"""
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * MAX_YEARS)
+
+        while dt <= limit:
+            if dt.month not in self.months:
+                # Jump to the first day of the next month
+                year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+                dt = datetime(year, month, 1)
+                continue
+
+            if not self._day_matches(dt):
+                dt = datetime(dt.year, dt.month, dt.day) + timedelta(days=1)
+                continue
+
+            if dt.hour not in self.hours:
+                later = [h for h in self.hours if h > dt.hour]
+                if later:
+                    dt = dt.replace(hour=min(later), minute=0)
+                else:
+                    dt = datetime(dt.year, dt.month, dt.day) + timedelta(days=1)
+                continue
+
+            if dt.minute not in self.minutes:
+                later = [m for m in self.minutes if m > dt.minute]
+                if later:
+                    dt = dt.replace(minute=min(later))
+                else:
+                    dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+
+            return dt
+
+        raise ValueError(f"Cron expression '{self.expression}' never fires")
+
+
+def spread_start(nominal, duration_seconds, busy, window_minutes, key, step_minutes=1):
+    """Pick a start in [nominal, nominal + window] with the least overlap.
+
+    busy is a list of (start, duration_seconds) for other planned runs.
+    Ties are broken by a hash of `key`, so schedules with the same cron
+    expression and no history still land on different minutes.
+    """
+    if not window_minutes or window_minutes <= 0:
+        return nominal
+
+    duration = timedelta(seconds=max(duration_seconds or 0, 60))
+    intervals = [(start, start + timedelta(seconds=max(dur or 0, 60))) for start, dur in busy]
+
+    candidates = []
+    for offset in range(0, int(window_minutes) + 1, step_minutes):
+        start = nominal + timedelta(minutes=offset)
+        end = start + duration
+        overlap = sum(
+            max(0.0, (min(end, b_end) - max(start, b_start)).total_seconds())
+            for b_start, b_end in intervals
+        )
+        candidates.append((overlap, start))
+
+    best = min(overlap for overlap, _ in candidates)
+    ties = [start for overlap, start in candidates if overlap == best]
+    digest = int(hashlib.md5(key.encode()).hexdigest(), 16)
+    return ties[digest % len(ties)]
@@ -0,0 +1,131 @@
+"""
+Flow control for syncs: adaptive batch sizing + process-wide memory budget.
+
+Batch sizes come from the measured row width and the observed load latency
+instead of a fixed number. Every sync running in the same process shares one
+MemoryBudget, so parallel syncs in that process cannot OOM it together.
+
+The budget is per process, not per container. cron starts a scheduler
+process every minute and a long sync keeps running into the next ones,
+and the bot runs manual syncs in its own container; each of them gets its
+own SYNC_MEMORY_BUDGET_MB. Size the container memory limit for
+SYNC_MEMORY_BUDGET_MB x the number of processes expected to overlap
+(plus interpreter overhead), or lower the budget accordingly.
+"""
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+SYNC_MEMORY_BUDGET_MB = int(os.getenv('SYNC_MEMORY_BUDGET_MB', '256'))
+SYNC_BATCH_MIN_ROWS = int(os.getenv('SYNC_BATCH_MIN_ROWS', '100'))
+SYNC_BATCH_MAX_ROWS = int(os.getenv('SYNC_BATCH_MAX_ROWS', '50000'))
+SYNC_BATCH_TARGET_SECONDS = float(os.getenv('SYNC_BATCH_TARGET_SECONDS', '2'))
+
+# Guess used by memory_cap_rows()/batch_bytes() before any row has been measured
+DEFAULT_ROW_BYTES = 512
+# A batch is held twice in memory: raw rows + converted rows
+BATCH_COPIES = 2
+# One sync may use at most 1/N of the budget per batch, the rest is for other syncs
+BATCH_BUDGET_SHARE = 4
+# Smoothing weight for new measurements (EWMA)
+SMOOTHING = 0.3
+
+
+class MemoryBudget:
+    """Byte budget shared by all syncs running in this process"""
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.used_bytes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes):
+        """Block until nbytes are available. Requests above the limit are clamped."""
+        nbytes = min(nbytes, self.limit_bytes)
+        with self._cond:
+            while self.used_bytes + nbytes > self.limit_bytes:
+                self._cond.wait()
+            self.used_bytes += nbytes
+        return nbytes
+
+    def release(self, nbytes):
+        with self._cond:
+            self.used_bytes = max(0, self.used_bytes - nbytes)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        granted = self.acquire(nbytes)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+
+MEMORY_BUDGET = MemoryBudget(SYNC_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def estimate_row_bytes(row):
+    """Approximate in-memory size of one row (tuple or pyodbc.Row)"""
+    size = sys.getsizeof(row)
+    for val in row:
+        size += sys.getsizeof(val)
+    return size
+
+
+class BatchSizer:
+    """Pick rows per fetch/load batch from row width and load latency"""
+
+    def __init__(self, budget=None, min_rows=None, max_rows=None,
+                 target_seconds=None):
+        self.budget = budget or MEMORY_BUDGET
+        self.min_rows = min_rows or SYNC_BATCH_MIN_ROWS
+        self.max_rows = max_rows or SYNC_BATCH_MAX_ROWS
+        self.target_seconds = target_seconds or SYNC_BATCH_TARGET_SECONDS
+        self.row_bytes = None
+        # Size of the first real batch, once the probe has measured the width
+        self.batch_rows = self.min_rows
+
+    def observe_rows(self, rows, sample_size=50):
+        """Update the row width estimate from a sample of a fetched batch"""
+        if not rows:
+            return
+        step = max(1, len(rows) // sample_size)
+        sample = rows[::step]
+        measured = sum(estimate_row_bytes(r) for r in sample) / len(sample)
+        if self.row_bytes is None:
+            self.row_bytes = measured
+        else:
+            self.row_bytes += SMOOTHING * (measured - self.row_bytes)
+
+    def observe_load(self, rows_count, seconds):
+        """Move the batch size so one load takes about target_seconds"""
+        if rows_count <= 0:
+            return
+        if seconds <= 0:
+            ideal = self.batch_rows * 2
+        else:
+            ideal = rows_count / seconds * self.target_seconds
+        # Don't move more than 2x per step, avoids oscillation
+        ideal = max(self.batch_rows / 2, min(self.batch_rows * 2, ideal))
+        self.batch_rows = int(self.batch_rows + SMOOTHING * (ideal - self.batch_rows))
+        self.batch_rows = max(self.min_rows, min(self.max_rows, self.batch_rows))
+
+    def memory_cap_rows(self):
+        """Max rows per batch that fit in one sync's share of the budget"""
+        row_bytes = self.row_bytes or DEFAULT_ROW_BYTES
+        share = self.budget.limit_bytes // BATCH_BUDGET_SHARE
+        return max(1, int(share // (row_bytes * BATCH_COPIES)))
+
+    def next_batch_rows(self):
+        # Probe with a single row first: the width of NVARCHAR(MAX)/VARBINARY
+        # rows is unknown, so no multi-row batch is reserved on a guess
+        if self.row_bytes is None:
+            return 1
+        return max(1, min(self.batch_rows, self.memory_cap_rows()))
+
+    def batch_bytes(self, rows_count):
+        """Bytes to reserve in the budget for a batch of rows_count rows"""
+        row_bytes = self.row_bytes or DEFAULT_ROW_BYTES
+        return int(rows_count * row_bytes * BATCH_COPIES)
@@ -0,0 +1,324 @@
+"""
+Job groups: sync a set of related tables in foreign-key order.
+
+The FK graph is read from the target (PostgreSQL) catalog. Parents are
+loaded before their children, independent branches run in parallel, and the
+group reports one result: if a member fails, its dependents are skipped,
+nothing new is started and the whole group is marked failed.
+
+The data is switched as a unit too. Members are loaded into unlogged
+staging tables (<schema>__<table> in SYNC_STAGING_SCHEMA, a schema only the
+sync uses, marked by its comment). Only when every member succeeded are the
+live tables truncated and refilled from staging in one transaction, parents
+first. A failed group leaves all members as they were. The cost is writing
+each row twice; indexes and user triggers of the live tables are deferred
+around the swap (LoadPhase).
+
+Unlike a single-table sync, which leaves the target alone when the source
+returns no rows, a group member with an empty source is emptied by the
+swap: the group mirrors the source snapshot as a whole, and keeping a
+member's old rows while its FK neighbours are replaced could leave them
+inconsistent (TRUNCATE of a referenced parent needs the child too).
+"""
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from log_pipeline import log_context
+from bulk_load import LoadPhase
+
+SYNC_GROUP_WORKERS = int(os.getenv('SYNC_GROUP_WORKERS', '4'))
+SYNC_STAGING_SCHEMA = os.getenv('SYNC_STAGING_SCHEMA', 'sync_stage')
+# Comment on the staging schema; a schema without it is never written to
+STAGING_MARK = 'warehorse job group staging (managed by the sync, contents are dropped)'
+
+logger = logging.getLogger(__name__)
+
+
+def parse_table_list(table_list):
+    """['ref.customers', 'datamart.orders'] -> [('ref', 'customers'), ...]"""
+    tables = []
+    for item in table_list or []:
+        item = item.strip()
+        if not item:
+            continue
+        if item.count('.') != 1:
+            raise ValueError(f"Invalid table '{item}', expected schema.table")
+        schema, table = item.split('.')
+        if (schema, table) not in tables:
+            tables.append((schema, table))
+    return tables
+
+
+def load_fk_edges(pg_conn, tables):
+    """Read FK edges touching the group from the target catalog.
+
+    Returns (deps, external): deps maps each member to the set of members it
+    references (its parents); external lists (child, parent) pairs where a
+    table outside the group references a member.
+    """
+    # Unquoted identifiers are folded to lower case by PostgreSQL
+    members = {(s.lower(), t.lower()): (s, t) for s, t in tables}
+    deps = {t: set() for t in tables}
+    external = []
+
+    cursor = pg_conn.cursor()
+    cursor.execute(
+        """SELECT cn.nspname, c.relname, pn.nspname, p.relname
+           FROM pg_constraint k
+           JOIN pg_class c ON c.oid = k.conrelid
+           JOIN pg_namespace cn ON cn.oid = c.relnamespace
+           JOIN pg_class p ON p.oid = k.confrelid
+           JOIN pg_namespace pn ON pn.oid = p.relnamespace
+           WHERE k.contype = 'f'"""
+    )
+    for child_schema, child_table, parent_schema, parent_table in cursor.fetchall():
+        child = (child_schema, child_table)
+        parent = members.get((parent_schema, parent_table))
+        if parent is None or child == (parent_schema, parent_table):
+            continue
+        if child in members:
+            deps[members[child]].add(parent)
+        else:
+            external.append((child, parent))
+    cursor.close()
+
+    return deps, external
+
+
+def find_cycle(deps):
+    """Return the members left over by a topological sort (non-empty = cycle)"""
+    remaining = {t: set(p) for t, p in deps.items()}
+    while True:
+        ready = [t for t, parents in remaining.items() if not parents]
+        if not ready:
+            return sorted(remaining)
+        for t in ready:
+            del remaining[t]
+        for parents in remaining.values():
+            parents.difference_update(ready)
+
+
+def fk_order(deps):
+    """Members sorted parents first (deps must be acyclic)"""
+    remaining = {t: set(p) for t, p in deps.items()}
+    order = []
+    while remaining:
+        ready = sorted(t for t, parents in remaining.items() if not parents)
+        for t in ready:
+            del remaining[t]
+            order.append(t)
+        for parents in remaining.values():
+            parents.difference_update(ready)
+    return order
+
+
+def staging_table(schema, table):
+    """(schema, table) of a member's staging table"""
+    return SYNC_STAGING_SCHEMA, f"{schema}__{table}"
+
+
+def ensure_staging_schema(cursor):
+    """Create the staging schema, or check that an existing one is ours"""
+    cursor.execute(
+        "SELECT obj_description(oid, 'pg_namespace') FROM pg_namespace WHERE nspname = %s",
+        (SYNC_STAGING_SCHEMA,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {SYNC_STAGING_SCHEMA}")
+        cursor.execute(f"COMMENT ON SCHEMA {SYNC_STAGING_SCHEMA} IS %s", (STAGING_MARK,))
+    elif row[0] != STAGING_MARK:
+        raise RuntimeError(f"Schema {SYNC_STAGING_SCHEMA} exists but is not the sync staging schema, "
+                           f"set SYNC_STAGING_SCHEMA to another name")
+
+
+def create_staging(pg_conn, tables):
+    """Empty unlogged copies of the members (columns, defaults, NOT NULL only)"""
+    cursor = pg_conn.cursor()
+    ensure_staging_schema(cursor)
+    for schema, table in tables:
+        stage_schema, stage = staging_table(schema, table)
+        # Leftover of an interrupted group; the schema is ours, nothing else lives here
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_schema}.{stage}")
+        cursor.execute(f"CREATE UNLOGGED TABLE {stage_schema}.{stage} "
+                       f"(LIKE {schema}.{table} INCLUDING DEFAULTS)")
+    pg_conn.commit()
+    cursor.close()
+
+
+def drop_staging(pg_conn, tables):
+    cursor = pg_conn.cursor()
+    for schema, table in tables:
+        stage_schema, stage = staging_table(schema, table)
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_schema}.{stage}")
+    pg_conn.commit()
+    cursor.close()
+
+
+def swap_in_group(pg_conn, order, pg_connect, group_name, timings):
+    """Replace all members with their staging data in one transaction.
+
+    TRUNCATE runs without CASCADE: PostgreSQL refuses it if a table outside
+    the group still references a member, so nothing outside the group is
+    emptied silently. Rows go in parents first, so FKs hold at every step.
+    """
+    phases = [LoadPhase(pg_connect, schema, table, timings.setdefault((schema, table), {}),
+                        f"{group_name}:{schema}.{table}")
+              for schema, table in order]
+    try:
+        for phase in phases:
+            phase.prepare()
+
+        cursor = pg_conn.cursor()
+        cursor.execute(f"TRUNCATE TABLE {', '.join(f'{s}.{t}' for s, t in order)}")
+        for schema, table in order:
+            started = time.monotonic()
+            stage_schema, stage = staging_table(schema, table)
+            cursor.execute(f"INSERT INTO {schema}.{table} SELECT * FROM {stage_schema}.{stage}")
+            timings[(schema, table)]['swap_in'] = round(time.monotonic() - started, 3)
+        pg_conn.commit()
+        cursor.close()
+    except Exception:
+        pg_conn.rollback()
+        raise
+    finally:
+        # Also after a failed swap, so the members get their indexes/triggers back
+        errors = []
+        for phase in phases:
+            if phase.prepared:
+                try:
+                    phase.finish()
+                except Exception as e:
+                    errors.append(f"{phase.schema}.{phase.table}: {e}")
+        if errors:
+            logger.error(f"[{group_name}] Restoring indexes/triggers failed: {'; '.join(errors)}")
+
+
+def run_job_group(group_name, tables, sync_fn, pg_connect, max_workers=None, timings=None):
+    """Sync tables in FK order. sync_fn(schema, table, name, into) -> (success, message, records),
+    where into is the (schema, table) staging table the member has to be loaded into.
+
+    Returns (success, message, results) where results maps each member to its
+    (status, message, records, duration_seconds); status is 'success',
+    'failed' or 'skipped'. Per-member load phase timings of the swap go into
+    `timings` ({member: {step: seconds}}) when given.
+    """
+    max_workers = max_workers or SYNC_GROUP_WORKERS
+    timings = timings if timings is not None else {}
+    results = {}
+
+    pg_conn = pg_connect()
+    try:
+        deps, external = load_fk_edges(pg_conn, tables)
+
+        if external:
+            refs = ', '.join(f"{c[0]}.{c[1]} -> {p[0]}.{p[1]}" for c, p in external)
+            return False, f"Tables outside the group reference members: {refs}", results
+
+        cycle = find_cycle(deps)
+        if cycle:
+            names = ', '.join(f"{s}.{t}" for s, t in cycle)
+            return False, f"FK cycle between: {names}", results
+
+        create_staging(pg_conn, tables)
+    finally:
+        pg_conn.close()
+
+    try:
+        return _load_and_swap(group_name, tables, deps, sync_fn, pg_connect, max_workers,
+                              timings, results)
+    finally:
+        try:
+            pg_conn = pg_connect()
+            try:
+                drop_staging(pg_conn, tables)
+            finally:
+                pg_conn.close()
+        except Exception as e:
+            logger.error(f"[{group_name}] Error dropping staging tables: {e}")
+
+
+def _load_and_swap(group_name, tables, deps, sync_fn, pg_connect, max_workers, timings, results):
+    pending = {t: set(p) for t, p in deps.items()}
+    children = {t: [c for c, parents in deps.items() if t in parents] for t in tables}
+    failed = False
+
+    def run_member(member):
+        schema, table = member
+        started = time.monotonic()
+        with log_context(table=f"{schema}.{table}"):
+            success, message, records = sync_fn(schema, table, group_name, staging_table(schema, table))
+        return success, message, records, int(time.monotonic() - started)
+
+    def skip_dependents(member):
+        for child in children[member]:
+            if child not in results:
+                results[child] = ('skipped', f"Parent {member[0]}.{member[1]} failed", 0, 0)
+                pending.pop(child, None)
+                skip_dependents(child)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+
+        while pending or running:
+            if not failed:
+                ready = [t for t, parents in pending.items() if not parents]
+                for member in ready:
+                    del pending[member]
+                    logger.info(f"[{group_name}] Starting member {member[0]}.{member[1]}")
+                    future = pool.submit(contextvars.copy_context().run, run_member, member)
+                    running[future] = member
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                member = running.pop(future)
+                try:
+                    success, message, records, duration = future.result()
+                except Exception as e:
+                    success, message, records, duration = False, str(e), 0, 0
+
+                results[member] = ('success' if success else 'failed', message, records, duration)
+
+                if success:
+                    for parents in pending.values():
+                        parents.discard(member)
+                else:
+                    failed = True
+                    logger.error(f"[{group_name}] Member {member[0]}.{member[1]} failed: {message}")
+                    skip_dependents(member)
+
+    # Members never started because the group already failed
+    for member in pending:
+        results.setdefault(member, ('skipped', 'Group failed', 0, 0))
+
+    synced = sum(r[2] for r in results.values())
+    if failed:
+        failures = [f"{s}.{t}" for (s, t), r in results.items() if r[0] == 'failed']
+        skipped = sum(1 for r in results.values() if r[0] == 'skipped')
+        return False, f"Failed: {', '.join(failures)}; skipped {skipped} table(s)", results
+
+    # Every member is staged: switch them all at once
+    for (schema, table), result in results.items():
+        if result[2] == 0:
+            logger.warning(f"[{group_name}] Source of {schema}.{table} returned no rows, "
+                           f"the swap empties it")
+    try:
+        pg_conn = pg_connect()
+        try:
+            swap_in_group(pg_conn, fk_order(deps), pg_connect, group_name, timings)
+        finally:
+            pg_conn.close()
+    except Exception as e:
+        logger.error(f"[{group_name}] Swap failed, members left unchanged: {e}")
+        for member, (status, message, records, duration) in results.items():
+            results[member] = ('failed', f"Swap failed: {e}", 0, duration)
+        return False, f"Swap failed, no table changed: {e}", results
+    logger.info(f"[{group_name}] Swapped in {len(tables)} table(s)")
+
+    return True, f"Synced {len(tables)} table(s), {synced} records", results
@@ -0,0 +1,216 @@
+"""
+Non-blocking structured logging for the scheduler and the bot.
+
+Callers only put records on an in-memory queue (QueueHandler). A background
+QueueListener thread does the disk/stdout I/O: JSON lines into a size-rotated
+file, plus the usual human readable line on stdout. If the queue is full the
+record is dropped and counted instead of blocking the sync.
+
+cron starts a scheduler process every minute and long syncs overlap with
+the next ones, all writing the same file. Rotation therefore happens under
+an flock shared by the processes (LockedRotatingFileHandler), and a process
+whose file was rotated away by another one reopens it. stdout_level limits
+the stdout copy (the scheduler's stdout is cron.log, which isn't rotated).
+
+Every record carries schedule, table and run_id from log_context(), which is
+stored in a ContextVar so it follows the sync through threads started with
+contextvars.copy_context() (and asyncio.to_thread in the bot).
+"""
+import os
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import fcntl
+import atexit
+import logging
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+SYNC_LOG_MAX_MB = int(os.getenv('SYNC_LOG_MAX_MB', '50'))
+SYNC_LOG_BACKUPS = int(os.getenv('SYNC_LOG_BACKUPS', '5'))
+SYNC_LOG_QUEUE_SIZE = int(os.getenv('SYNC_LOG_QUEUE_SIZE', '10000'))
+# Per-batch lines: log the first one, then every Nth or one per interval
+SYNC_LOG_BATCH_EVERY = int(os.getenv('SYNC_LOG_BATCH_EVERY', '20'))
+SYNC_LOG_BATCH_SECONDS = float(os.getenv('SYNC_LOG_BATCH_SECONDS', '30'))
+
+CONTEXT_FIELDS = ('schedule', 'table', 'run_id')
+
+_context = contextvars.ContextVar('sync_log_context', default={})
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def get_log_context():
+    return dict(_context.get())
+
+
+@contextmanager
+def log_context(**fields):
+    """Add schedule/table/run_id to every record logged inside the block"""
+    merged = dict(_context.get())
+    merged.update({k: v for k, v in fields.items() if v is not None})
+    token = _context.set(merged)
+    try:
+        yield merged
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current log_context onto the record (runs in the caller's thread)"""
+
+    def filter(self, record):
+        ctx = _context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, ctx.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: drops (and counts) records when full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message now, keep the traceback apart for the JSON "exc" field
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogSampler:
+    """Let the first event through, then every Nth or one per interval"""
+
+    def __init__(self, every=None, seconds=None):
+        self.every = every or SYNC_LOG_BATCH_EVERY
+        self.seconds = seconds or SYNC_LOG_BATCH_SECONDS
+        self.count = 0
+        self.last = None
+
+    def should_log(self):
+        self.count += 1
+        now = time.monotonic()
+        if self.last is None or self.count % self.every == 0 or now - self.last >= self.seconds:
+            self.last = now
+            return True
+        return False
+
+
+class LockedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that is safe with several processes on one file
+
+    Every write holds an exclusive flock on <file>.lock. Under it the handler
+    first reopens the file if another process rotated it (inode changed),
+    then does the usual size check / rollover and the write.
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        super().__init__(filename, *args, **kwargs)
+        self._lock_file = open(self.baseFilename + '.lock', 'a')
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            on_disk = None
+        current = os.fstat(self.stream.fileno())
+        if on_disk is None or (on_disk.st_dev, on_disk.st_ino) != (current.st_dev, current.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self._reopen_if_rotated()
+            super().emit(record)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        super().close()
+        self._lock_file.close()
+
+
+def setup_logging(log_file=None, level=logging.INFO,
+                  fmt='%(asctime)s - %(levelname)s - %(message)s', stdout_level=None):
+    """Route the root logger through a queue to rotated JSON file + stdout"""
+    handlers = []
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter(fmt))
+    if stdout_level is not None:
+        stream.setLevel(stdout_level)
+    handlers.append(stream)
+
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        file_handler = LockedRotatingFileHandler(
+            log_file,
+            maxBytes=SYNC_LOG_MAX_MB * 1024 * 1024,
+            backupCount=SYNC_LOG_BACKUPS,
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=SYNC_LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def shutdown():
+        listener.stop()
+        if queue_handler.dropped:
+            sys.stderr.write(f"log_pipeline: dropped {queue_handler.dropped} log record(s)\n")
+
+    atexit.register(shutdown)
+    return listener
@@ -43,6 +43,9 @@ cat << 'EOF'
 12. View Telegram Bot Logs:
     docker logs -f telegram-sync-bot
 
+13. Query JSON Logs for One Run (schedule/table/run_id per line):
+    docker exec sync-scheduler sh -c "grep '\"run_id\": \"<run_id>\"' /app/logs/sync_scheduler.log*"
+
 EOF
 
 echo ""
@@ -67,8 +70,8 @@ EOF
 
 echo ""
 echo "📁 LOG LOCATIONS (inside container):"
-echo "   /app/logs/sync_scheduler.log  - Main scheduler logs"
-echo "   /app/logs/cron.log            - Cron execution logs"
+echo "   /app/logs/sync_scheduler.log  - Main scheduler logs (JSON lines, rotated to .1 .. .5)"
+echo "   /app/logs/cron.log            - Cron execution logs (warnings/errors and crashes only)"
 echo ""
 echo "📁 LOG LOCATIONS (host):"
 echo "   ./scheduler/logs/sync_scheduler.log"
@@ -0,0 +1,215 @@
+"""
+Pipelined copy: MSSQL fetch, Python conversion and PostgreSQL load overlap.
+
+Run one after another, the MSSQL connection sits idle while PostgreSQL
+loads and the other way round. run_pipeline() splits a copy into stages:
+
+  fetch    - thread, fetchmany() under a MEMORY_BUDGET reservation
+  convert  - thread, turns raw rows into load-ready tuples
+  load     - the caller's thread (it owns the PostgreSQL connection)
+
+joined by queues of SYNC_PIPELINE_DEPTH batches. A full queue blocks the
+stage in front of it (backpressure), and a batch's budget reservation is
+only released once it is loaded, so a slow target throttles the fetch
+instead of piling up rows. Wall-clock time tends to the slowest stage
+rather than the sum of the three. pyodbc and psycopg2 release the GIL while
+waiting on the network, so the threads do overlap.
+
+SYNC_PIPELINE_DEPTH=0 runs the stages sequentially in the caller's thread.
+"""
+import os
+import time
+import queue
+import threading
+import contextvars
+
+from flow_control import MEMORY_BUDGET
+from cancellation import check_cancelled
+from profiling import thread_profile
+
+# Batches buffered between two stages, 0 = no pipelining
+SYNC_PIPELINE_DEPTH = int(os.getenv('SYNC_PIPELINE_DEPTH', '2'))
+
+# End of data marker passed down the stages
+_END = object()
+
+
+class _Batch:
+    __slots__ = ('rows', 'granted')
+
+    def __init__(self, rows, granted):
+        self.rows = rows
+        self.granted = granted
+
+
+class _Pipeline:
+    def __init__(self, fetch, convert, sizer, label, depth):
+        self.fetch = fetch
+        self.convert = convert
+        self.sizer = sizer
+        self.label = label
+        self.sizer_lock = threading.Lock()
+        self.fetched = queue.Queue(maxsize=depth)
+        self.converted = queue.Queue(maxsize=depth)
+        self.stop = threading.Event()
+        self.error = None
+        self.threads = []
+
+    def start(self):
+        for name, stage in (('fetch', self._fetch_stage), ('convert', self._convert_stage)):
+            thread = threading.Thread(
+                target=contextvars.copy_context().run, args=(self._guard, stage),
+                name=f"pipeline-{name}-{self.label}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+
+    def _guard(self, stage):
+        """First error wins; it stops the other stages"""
+        try:
+            with thread_profile():
+                stage()
+        except BaseException as e:
+            if self.error is None:
+                self.error = e
+            self.stop.set()
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the pipeline is stopping"""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch_stage(self):
+        try:
+            while not self.stop.is_set():
+                # Chunk boundary: stop here if the job was cancelled / timed out
+                check_cancelled()
+                with self.sizer_lock:
+                    batch_rows = self.sizer.next_batch_rows()
+                    nbytes = self.sizer.batch_bytes(batch_rows)
+                granted = MEMORY_BUDGET.acquire(nbytes)
+                try:
+                    rows = self.fetch(batch_rows)
+                except BaseException:
+                    MEMORY_BUDGET.release(granted)
+                    raise
+                if not rows:
+                    MEMORY_BUDGET.release(granted)
+                    break
+                with self.sizer_lock:
+                    self.sizer.observe_rows(rows)
+                if not self._put(self.fetched, _Batch(rows, granted)):
+                    MEMORY_BUDGET.release(granted)
+                    return
+        finally:
+            self._put(self.fetched, _END)
+
+    def _convert_stage(self):
+        try:
+            while True:
+                batch = self._get(self.fetched)
+                if batch is _END:
+                    break
+                try:
+                    batch.rows = self.convert(batch.rows)
+                except BaseException:
+                    MEMORY_BUDGET.release(batch.granted)
+                    raise
+                if not self._put(self.converted, batch):
+                    MEMORY_BUDGET.release(batch.granted)
+                    return
+        finally:
+            self._put(self.converted, _END)
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                if self.stop.is_set():
+                    return _END
+
+    def next_converted(self):
+        return self._get(self.converted)
+
+    def shutdown(self):
+        """Stop the stages and hand back the budget of batches still queued"""
+        self.stop.set()
+        for thread in self.threads:
+            while thread.is_alive():
+                self._drain()
+                thread.join(timeout=0.1)
+        self._drain()
+
+    def _drain(self):
+        for q in (self.fetched, self.converted):
+            while True:
+                try:
+                    batch = q.get_nowait()
+                except queue.Empty:
+                    break
+                if batch is not _END:
+                    MEMORY_BUDGET.release(batch.granted)
+
+
+def run_pipeline(fetch, convert, load, sizer, label, depth=None):
+    """fetch -> convert -> load with overlapping stages, returns rows loaded
+
+    fetch(n) returns up to n raw rows (empty at the end), convert(rows) the
+    values to load, load(values) writes one batch. load runs in the caller's
+    thread; fetch and convert run in worker threads that inherit the
+    caller's context (cancel token, log context, profile session). sizer is
+    the run's BatchSizer: fetch observes row width, load observes latency.
+    """
+    depth = SYNC_PIPELINE_DEPTH if depth is None else depth
+    if depth <= 0:
+        return _run_sequential(fetch, convert, load, sizer)
+
+    pipeline = _Pipeline(fetch, convert, sizer, label, depth)
+    pipeline.start()
+    loaded = 0
+    try:
+        while True:
+            batch = pipeline.next_converted()
+            if batch is _END:
+                break
+            try:
+                check_cancelled()
+                load_start = time.monotonic()
+                load(batch.rows)
+                seconds = time.monotonic() - load_start
+            finally:
+                MEMORY_BUDGET.release(batch.granted)
+            with pipeline.sizer_lock:
+                sizer.observe_load(len(batch.rows), seconds)
+            loaded += len(batch.rows)
+    finally:
+        pipeline.shutdown()
+
+    if pipeline.error is not None:
+        raise pipeline.error
+    return loaded
+
+
+def _run_sequential(fetch, convert, load, sizer):
+    loaded = 0
+    while True:
+        check_cancelled()
+        batch_rows = sizer.next_batch_rows()
+        with MEMORY_BUDGET.reserve(sizer.batch_bytes(batch_rows)):
+            rows = fetch(batch_rows)
+            if not rows:
+                break
+            sizer.observe_rows(rows)
+            values = convert(rows)
+            rows = None
+            load_start = time.monotonic()
+            load(values)
+            sizer.observe_load(len(values), time.monotonic() - load_start)
+        loaded += len(values)
+    return loaded
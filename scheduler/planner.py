@@ -0,0 +1,381 @@
+"""
+Cost-based sync planner: picks a strategy per table before it is synced.
+
+Inputs are cheap catalog reads: row count and size from
+sys.dm_db_partition_stats, the primary key, rowversion column and Change
+Tracking versions on the source, estimated row count (pg_stat_user_tables /
+pg_class) and key constraint on the target, the state left by the previous
+run (public.sync_state) and the average duration from sync_logs. The
+queries that scan data - MAX(rowversion) on the source and an exact
+COUNT(*) on the target - only run when a stored watermark makes skip or
+incremental possible.
+
+Strategies:
+  skip         - source unchanged since the last sync (rowversion + row count,
+                 or no Change Tracking version bump)
+  change_tracking - apply CHANGETABLE(CHANGES) since the stored version:
+                 upserts and deletes
+  incremental  - upsert rows with rowversion >= stored watermark
+  partitioned  - full reload, key range split over parallel workers
+  full         - truncate + reload (the original behaviour)
+
+attached is not chosen here: it marks a request that joined a sync of the
+same table already in flight (see single_flight).
+"""
+import os
+from datetime import datetime, timedelta
+
+SYNC_PARTITION_MIN_ROWS = int(os.getenv('SYNC_PARTITION_MIN_ROWS', '5000000'))
+SYNC_PARTITION_MIN_MB = int(os.getenv('SYNC_PARTITION_MIN_MB', '2048'))
+SYNC_PARTITION_MIN_SECONDS = int(os.getenv('SYNC_PARTITION_MIN_SECONDS', '900'))
+SYNC_PARTITION_WORKERS = int(os.getenv('SYNC_PARTITION_WORKERS', '4'))
+# Incremental can't see deletes balanced by inserts, force a full reload this often
+SYNC_FULL_RELOAD_DAYS = int(os.getenv('SYNC_FULL_RELOAD_DAYS', '7'))
+
+FULL = 'full'
+INCREMENTAL = 'incremental'
+PARTITIONED = 'partitioned'
+SKIP = 'skip'
+CHANGE_TRACKING = 'change_tracking'
+ATTACHED = 'attached'
+
+# sys.types.system_type_id of timestamp/rowversion
+ROWVERSION_TYPE_ID = 189
+INTEGER_KEY_TYPES = {'tinyint', 'smallint', 'int', 'bigint'}
+
+
+class SyncPlan:
+    """Chosen strategy plus the numbers it was based on"""
+
+    def __init__(self, strategy, reason, source=None, target=None, state=None,
+                 history=None, partitions=None):
+        self.strategy = strategy
+        self.reason = reason
+        self.source = source or {}
+        self.target = target or {}
+        self.state = state or {}
+        self.history = history or {}
+        self.partitions = partitions or []
+        # Load phase timings (seconds), filled in while the plan runs
+        self.phases = {}
+
+    def describe(self):
+        """Multi-line, human readable summary (used by logs and /sync plan)"""
+        lines = [f"Strategy: {self.strategy}", f"Reason: {self.reason}"]
+        src = self.source
+        if src.get('row_count') is not None:
+            lines.append(f"Source: {src['row_count']:,} rows, {src.get('size_mb', 0):,.1f} MB")
+        if src.get('key_columns'):
+            lines.append(f"Key: {', '.join(name for name, _ in src['key_columns'])}")
+        if src.get('rowversion_column'):
+            lines.append(f"Rowversion: {src['rowversion_column']}")
+        if src.get('change_tracking'):
+            lines.append(f"Change Tracking: version {src.get('ct_current_version')} "
+                         f"(min valid {src.get('ct_min_valid_version')}, "
+                         f"stored {self.state.get('ct_version')})")
+        if self.target.get('row_count') is not None:
+            lines.append(f"Target: {self.target['row_count']:,} rows")
+        elif self.target.get('row_estimate') is not None:
+            lines.append(f"Target: ~{self.target['row_estimate']:,} rows (estimate)")
+        if self.history.get('avg_duration') is not None:
+            lines.append(f"Avg duration: {self.history['avg_duration']:.0f}s "
+                         f"({self.history.get('runs', 0)} runs / 30d)")
+        if self.partitions:
+            lines.append(f"Partitions: {len(self.partitions)}")
+        return '\n'.join(lines)
+
+
+def collect_source_stats(mssql_cursor, schema, table, exact=False):
+    """Row count, size, primary key and rowversion column of the source table
+
+    exact=True also reads MAX(rowversion), which scans the table unless the
+    column is indexed; only needed to compare against a stored watermark.
+    """
+    full_name = f"[{schema}].[{table}]"
+    stats = {'row_count': None, 'size_mb': None, 'key_columns': [], 'rowversion_column': None,
+             'change_tracking': False}
+
+    try:
+        mssql_cursor.execute(
+            """SELECT SUM(CASE WHEN index_id IN (0, 1) THEN row_count ELSE 0 END),
+                      SUM(used_page_count) * 8 / 1024.0
+               FROM sys.dm_db_partition_stats
+               WHERE object_id = OBJECT_ID(?)""",
+            (full_name,)
+        )
+        row = mssql_cursor.fetchone()
+        if row and row[0] is not None:
+            stats['row_count'] = int(row[0])
+            stats['size_mb'] = float(row[1] or 0)
+    except Exception as e:
+        # Needs VIEW DATABASE STATE; plan without sizes if not granted
+        stats['stats_error'] = str(e)
+
+    mssql_cursor.execute(
+        """SELECT kcu.COLUMN_NAME, c.DATA_TYPE
+           FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+           JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu
+             ON kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+            AND kcu.TABLE_SCHEMA = tc.TABLE_SCHEMA
+           JOIN INFORMATION_SCHEMA.COLUMNS c
+             ON c.TABLE_SCHEMA = kcu.TABLE_SCHEMA
+            AND c.TABLE_NAME = kcu.TABLE_NAME
+            AND c.COLUMN_NAME = kcu.COLUMN_NAME
+           WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
+             AND tc.TABLE_SCHEMA = ? AND tc.TABLE_NAME = ?
+           ORDER BY kcu.ORDINAL_POSITION""",
+        (schema, table)
+    )
+    stats['key_columns'] = [(name, data_type.lower()) for name, data_type in mssql_cursor.fetchall()]
+
+    mssql_cursor.execute(
+        "SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) AND system_type_id = ?",
+        (full_name, ROWVERSION_TYPE_ID)
+    )
+    row = mssql_cursor.fetchone()
+    if row:
+        stats['rowversion_column'] = row[0]
+        if exact:
+            mssql_cursor.execute(f"SELECT MAX([{row[0]}]), MIN_ACTIVE_ROWVERSION() FROM {full_name}")
+            stats['max_rowversion'], stats['min_active_rowversion'] = mssql_cursor.fetchone()
+        else:
+            # Still needed: it becomes the watermark stored after this run
+            mssql_cursor.execute("SELECT MIN_ACTIVE_ROWVERSION()")
+            stats['min_active_rowversion'] = mssql_cursor.fetchone()[0]
+
+    try:
+        # Current version is read before the extract, it becomes the next stored version
+        mssql_cursor.execute(
+            """SELECT CHANGE_TRACKING_CURRENT_VERSION(), CHANGE_TRACKING_MIN_VALID_VERSION(object_id)
+               FROM sys.change_tracking_tables
+               WHERE object_id = OBJECT_ID(?)""",
+            (full_name,)
+        )
+        row = mssql_cursor.fetchone()
+        if row:
+            stats['change_tracking'] = True
+            stats['ct_current_version'], stats['ct_min_valid_version'] = row
+    except Exception as e:
+        # Needs VIEW CHANGE TRACKING on the table
+        stats['change_tracking_error'] = str(e)
+
+    return stats
+
+
+def collect_target_stats(pg_cursor, schema, table, key_columns, exact=False):
+    """Row count of the target and whether it has a unique key for upserts
+
+    row_estimate comes from the statistics (n_live_tup, else reltuples) and
+    is enough for sizing. exact=True adds row_count from COUNT(*), a full
+    scan, for the skip / incremental checks that compare counts.
+    """
+    pg_cursor.execute(
+        """SELECT c.oid IS NOT NULL, s.n_live_tup, c.reltuples
+           FROM (SELECT to_regclass(%s) AS oid) r
+           LEFT JOIN pg_class c ON c.oid = r.oid
+           LEFT JOIN pg_stat_user_tables s ON s.relid = r.oid""",
+        (f"{schema}.{table}",)
+    )
+    exists, live_tuples, reltuples = pg_cursor.fetchone()
+    if not exists:
+        return {'exists': False, 'row_count': None, 'row_estimate': None, 'has_key': False}
+
+    # reltuples is -1 until the table is first vacuumed/analyzed
+    if live_tuples is not None:
+        row_estimate = int(live_tuples)
+    elif reltuples is not None and reltuples >= 0:
+        row_estimate = int(reltuples)
+    else:
+        row_estimate = None
+
+    row_count = None
+    if exact:
+        pg_cursor.execute(f"SELECT COUNT(*) FROM {schema}.{table}")
+        row_count = pg_cursor.fetchone()[0]
+
+    has_key = False
+    if key_columns:
+        pg_cursor.execute(
+            """SELECT array_agg(a.attname::text ORDER BY a.attname)
+               FROM pg_index i
+               JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+               WHERE i.indrelid = to_regclass(%s) AND i.indisunique
+               GROUP BY i.indexrelid""",
+            (f"{schema}.{table}",)
+        )
+        wanted = sorted(name for name, _ in key_columns)
+        has_key = any(sorted(cols) == wanted for (cols,) in pg_cursor.fetchall())
+
+    return {'exists': True, 'row_count': row_count, 'row_estimate': row_estimate, 'has_key': has_key}
+
+
+def load_sync_state(pg_cursor, schema, table):
+    pg_cursor.execute(
+        """SELECT rowversion, last_full_at, ct_version FROM public.sync_state
+           WHERE source_schema = %s AND source_table = %s""",
+        (schema, table)
+    )
+    row = pg_cursor.fetchone()
+    if not row:
+        return {}
+    return {'rowversion': bytes(row[0]) if row[0] is not None else None, 'last_full_at': row[1],
+            'ct_version': row[2]}
+
+
+def save_sync_state(pg_conn, schema, table, rowversion, full_reload, ct_version=None):
+    """Remember the watermark / Change Tracking version taken before this run's extract started"""
+    cursor = pg_conn.cursor()
+    cursor.execute(
+        """INSERT INTO public.sync_state
+           (source_schema, source_table, rowversion, last_full_at, ct_version, updated_at)
+           VALUES (%s, %s, %s, CASE WHEN %s THEN NOW() END, %s, NOW())
+           ON CONFLICT (source_schema, source_table) DO UPDATE
+           SET rowversion = EXCLUDED.rowversion,
+               last_full_at = COALESCE(EXCLUDED.last_full_at, public.sync_state.last_full_at),
+               ct_version = EXCLUDED.ct_version,
+               updated_at = NOW()""",
+        (schema, table, rowversion, full_reload, ct_version)
+    )
+    pg_conn.commit()
+    cursor.close()
+
+
+def invalidate_sync_state(pg_conn, schema, table):
+    """Drop the watermark so the next run can't choose incremental/change tracking/skip"""
+    cursor = pg_conn.cursor()
+    cursor.execute(
+        """UPDATE public.sync_state SET rowversion = NULL, ct_version = NULL, updated_at = NOW()
+           WHERE source_schema = %s AND source_table = %s""",
+        (schema, table)
+    )
+    pg_conn.commit()
+    cursor.close()
+
+
+def load_history(pg_cursor, schema, table):
+    pg_cursor.execute(
+        """SELECT AVG(duration_seconds), COUNT(*) FROM public.sync_logs
+           WHERE source_schema = %s AND source_table = %s AND status = 'success'
+             AND started_at > NOW() - INTERVAL '30 days'""",
+        (schema, table)
+    )
+    avg_duration, runs = pg_cursor.fetchone()
+    return {'avg_duration': float(avg_duration) if avg_duration is not None else None, 'runs': runs}
+
+
+def key_ranges(mssql_cursor, schema, table, key_column, parts):
+    """Split [MIN(key), MAX(key)] into `parts` half-open ranges (last one closed)"""
+    mssql_cursor.execute(f"SELECT MIN([{key_column}]), MAX([{key_column}]) FROM [{schema}].[{table}]")
+    low, high = mssql_cursor.fetchone()
+    if low is None:
+        return []
+    step = max(1, (high - low + parts) // parts)
+    ranges = []
+    start = low
+    while start <= high:
+        end = start + step
+        ranges.append((start, end if end <= high else None))
+        start = end
+    return ranges
+
+
+def choose_strategy(source, target, state, history, columns=None, row_filter=None, now=None):
+    """Pure decision function, returns (strategy, reason)"""
+    now = now or datetime.now()
+    rv_col = source.get('rowversion_column')
+    key_columns = source.get('key_columns') or []
+    row_count = source.get('row_count')
+    watermark = state.get('rowversion')
+    pushdown = bool(columns or row_filter)
+
+    if not target.get('exists'):
+        return FULL, "Target table not found (full load will report the error)"
+
+    # Change Tracking sees deletes, so it needs no periodic full reload
+    ct_version = state.get('ct_version')
+    if source.get('change_tracking') and not pushdown and key_columns and target.get('has_key'):
+        min_valid = source.get('ct_min_valid_version')
+        current = source.get('ct_current_version')
+        if ct_version is None:
+            return _full_or_partitioned(source, history, "Change Tracking enabled, no stored version yet")
+        if min_valid is not None and ct_version < min_valid:
+            return _full_or_partitioned(
+                source, history,
+                f"Stored Change Tracking version {ct_version} is below the retention minimum {min_valid}")
+        if current is not None and current == ct_version:
+            return SKIP, f"No Change Tracking changes since version {ct_version}"
+        return CHANGE_TRACKING, f"Change Tracking from version {ct_version} (current {current}), deletes included"
+
+    last_full = state.get('last_full_at')
+    full_due = last_full is None or now - last_full > timedelta(days=SYNC_FULL_RELOAD_DAYS)
+    target_rows = target.get('row_count')
+
+    if rv_col and watermark is not None and not pushdown and row_count is not None:
+        unchanged = source.get('max_rowversion') is None or source['max_rowversion'] < watermark
+        if unchanged and row_count == target_rows and not full_due:
+            return SKIP, (f"No rowversion change since last sync and row counts match "
+                          f"({row_count:,} rows)")
+
+        if not full_due and key_columns and target.get('has_key'):
+            if row_count < (target_rows or 0):
+                reason_full = (f"Source has fewer rows than target ({row_count:,} < {target_rows:,}), "
+                               f"deletes need a full reload")
+                return _full_or_partitioned(source, history, reason_full)
+            return INCREMENTAL, (f"Rowversion column {rv_col} + key + previous watermark; "
+                                 f"last full reload {last_full:%Y-%m-%d %H:%M}")
+
+    if pushdown:
+        reason = "Column list / row filter set, only full strategies apply"
+    elif not rv_col:
+        reason = "No rowversion column, changes can't be detected"
+    elif watermark is None:
+        reason = "No previous watermark"
+    elif full_due:
+        reason = f"Last full reload older than {SYNC_FULL_RELOAD_DAYS} days"
+    elif not key_columns:
+        reason = "No primary key on source"
+    else:
+        reason = "Target has no unique index on the key, upsert impossible"
+
+    return _full_or_partitioned(source, history, reason)
+
+
+def _full_or_partitioned(source, history, reason):
+    key_columns = source.get('key_columns') or []
+    single_int_key = len(key_columns) == 1 and key_columns[0][1] in INTEGER_KEY_TYPES
+    big = ((source.get('row_count') or 0) >= SYNC_PARTITION_MIN_ROWS
+           or (source.get('size_mb') or 0) >= SYNC_PARTITION_MIN_MB
+           or (history.get('avg_duration') or 0) >= SYNC_PARTITION_MIN_SECONDS)
+
+    if big and single_int_key and SYNC_PARTITION_WORKERS > 1:
+        return PARTITIONED, f"{reason}; large table with integer key, split over {SYNC_PARTITION_WORKERS} workers"
+    return FULL, reason
+
+
+def plan_sync(mssql_conn, pg_conn, schema, table, columns=None, row_filter=None):
+    """Collect stats and choose a strategy for one table"""
+    mssql_cursor = mssql_conn.cursor()
+    pg_cursor = pg_conn.cursor()
+    try:
+        state = load_sync_state(pg_cursor, schema, table)
+        # Without a watermark neither skip nor incremental is possible, so
+        # the scans behind MAX(rowversion) and COUNT(*) would be wasted
+        exact = state.get('rowversion') is not None and not (columns or row_filter)
+        source = collect_source_stats(mssql_cursor, schema, table, exact)
+        target = collect_target_stats(pg_cursor, schema, table, source['key_columns'], exact)
+        history = load_history(pg_cursor, schema, table)
+        pg_conn.commit()
+
+        strategy, reason = choose_strategy(source, target, state, history, columns, row_filter)
+
+        partitions = []
+        if strategy == PARTITIONED:
+            partitions = key_ranges(mssql_cursor, schema, table,
+                                    source['key_columns'][0][0], SYNC_PARTITION_WORKERS)
+            if len(partitions) < 2:
+                strategy, reason, partitions = FULL, f"{reason}; key range too small to split", []
+
+        return SyncPlan(strategy, reason, source, target, state, history, partitions)
+    finally:
+        mssql_cursor.close()
+        pg_cursor.close()
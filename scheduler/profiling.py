@@ -0,0 +1,253 @@
+"""
+On-demand profiling of a single sync run.
+
+ProfileSession runs the sync under cProfile and tracemalloc. cProfile only
+sees the thread it was enabled in, so pool workers that belong to the run
+(partition workers, job group members) wrap their work in thread_profile(),
+which adds their stats to the session found in the current context.
+
+The result is stored in public.sync_profiles under the run_id of the
+sync_logs row: the raw pstats dump (open it with pstats/snakeviz), the top
+functions, the top allocation sites, and the time split between fetch
+(pyodbc), convert and load (psycopg2).
+"""
+import os
+import io
+import time
+import pstats
+import cProfile
+import logging
+import tempfile
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+
+from psycopg2.extras import Json
+
+SYNC_PROFILE_TOP = int(os.getenv('SYNC_PROFILE_TOP', '15'))
+# Frames kept per allocation (more frames = more tracemalloc overhead)
+SYNC_PROFILE_TRACE_FRAMES = int(os.getenv('SYNC_PROFILE_TRACE_FRAMES', '5'))
+
+PROFILES_DDL = """CREATE TABLE IF NOT EXISTS public.sync_profiles (
+           id SERIAL PRIMARY KEY,
+           run_id TEXT,
+           schedule_name TEXT,
+           source_schema TEXT,
+           source_table TEXT,
+           wall_seconds NUMERIC,
+           phases JSONB,
+           top_functions JSONB,
+           top_allocations JSONB,
+           peak_memory_bytes BIGINT,
+           pstats BYTEA,
+           created_at TIMESTAMP DEFAULT NOW()
+       )"""
+
+# Function name fragments per phase, matched against pstats entries
+PHASES = {
+    'fetch': ('fetchmany', 'fetchall', 'fetchone'),
+    'convert': ('convert_value',),
+    'load': ('executemany', "method 'execute' of 'psycopg2", "method 'commit' of 'psycopg2"),
+}
+
+# Threads waiting on workers/locks, left out of the hot-spot list
+IDLE = ("acquire' of '_thread.lock", "acquire' of '_thread.RLock")
+
+logger = logging.getLogger(__name__)
+
+_session = contextvars.ContextVar('sync_profile_session', default=None)
+
+# tracemalloc is process wide, sessions can overlap (bot: several users)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(SYNC_PROFILE_TRACE_FRAMES)
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+def _func_label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+class ProfileSession:
+    """cProfile + tracemalloc around one sync run"""
+
+    def __init__(self, label):
+        self.label = label
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.stats = None
+        self.snapshot = None
+        self.peak_bytes = None
+        self.wall_seconds = None
+        self._profile = None
+        self._token = None
+        self._started = None
+
+    def __enter__(self):
+        _start_tracemalloc()
+        tracemalloc.reset_peak()
+        self._started = time.monotonic()
+        self._token = _session.set(self)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.disable()
+        _session.reset(self._token)
+        self.wall_seconds = round(time.monotonic() - self._started, 3)
+        try:
+            self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            _stop_tracemalloc()
+
+        self.add(self._profile)
+        logger.info(f"[{self.label}] Profile captured: {self.wall_seconds}s wall, "
+                    f"{len(self.profiles)} thread(s)")
+        return False
+
+    def add(self, profile):
+        """Merge a (worker thread) profile into this session"""
+        with self.lock:
+            self.profiles.append(profile)
+            if self.stats is None:
+                self.stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                self.stats.add(profile)
+
+    def top_functions(self, limit=None):
+        """[{function, calls, tottime, cumtime}] ordered by own time"""
+        limit = limit or SYNC_PROFILE_TOP
+        rows = []
+        for func, (cc, nc, tt, ct, callers) in self.stats.stats.items():
+            label = _func_label(func)
+            if any(fragment in label for fragment in IDLE):
+                continue
+            rows.append({
+                'function': label,
+                'calls': nc,
+                'tottime': round(tt, 4),
+                'cumtime': round(ct, 4),
+            })
+        rows.sort(key=lambda r: r['tottime'], reverse=True)
+        return rows[:limit]
+
+    def phase_times(self):
+        """Seconds in fetch / load (own time of the driver calls) and convert (cumulative)"""
+        phases = {name: 0.0 for name in PHASES}
+        for func, (cc, nc, tt, ct, callers) in self.stats.stats.items():
+            label = _func_label(func)
+            for name, fragments in PHASES.items():
+                if any(fragment in label for fragment in fragments):
+                    phases[name] += tt if name != 'convert' else ct
+                    break
+        return {name: round(seconds, 3) for name, seconds in phases.items()}
+
+    def top_allocations(self, limit=None):
+        """[{site, size_kb, count}] of memory still allocated at the end of the run"""
+        limit = limit or SYNC_PROFILE_TOP
+        if self.snapshot is None:
+            return []
+        result = []
+        for stat in self.snapshot.statistics('lineno')[:limit]:
+            frame = stat.traceback[0]
+            result.append({
+                'site': f"{os.path.basename(frame.filename)}:{frame.lineno}",
+                'size_kb': round(stat.size / 1024, 1),
+                'count': stat.count,
+            })
+        return result
+
+    def pstats_bytes(self):
+        with tempfile.NamedTemporaryFile(suffix='.pstats', delete=False) as tmp:
+            path = tmp.name
+        try:
+            self.stats.dump_stats(path)
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.unlink(path)
+
+    def summary(self, top=5):
+        """Short hot-spot text (fits in a chat message)"""
+        lines = [f"Wall: {self.wall_seconds}s"]
+        phases = self.phase_times()
+        lines.append("Phases: " + ", ".join(f"{name} {seconds}s" for name, seconds in phases.items()))
+        if self.peak_bytes is not None:
+            lines.append(f"Peak memory: {self.peak_bytes / 1024 / 1024:.1f} MB")
+        lines.append("Top functions (own time):")
+        for row in self.top_functions(top):
+            lines.append(f"  {row['tottime']}s {row['function']} x{row['calls']}")
+        allocations = self.top_allocations(3)
+        if allocations:
+            lines.append("Top allocations:")
+            for row in allocations:
+                lines.append(f"  {row['size_kb']} KB {row['site']} ({row['count']} blocks)")
+        return '\n'.join(lines)
+
+    def save(self, pg_conn, run_id, schedule_name, schema, table):
+        """Store the profile next to the run's sync_logs row (same run_id), returns id"""
+        cursor = pg_conn.cursor()
+        cursor.execute(
+            """INSERT INTO public.sync_profiles
+               (run_id, schedule_name, source_schema, source_table, wall_seconds, phases,
+                top_functions, top_allocations, peak_memory_bytes, pstats)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+               RETURNING id""",
+            (run_id, schedule_name, schema, table, self.wall_seconds,
+             Json(self.phase_times()), Json(self.top_functions()),
+             Json(self.top_allocations()), self.peak_bytes, self.pstats_bytes())
+        )
+        profile_id = cursor.fetchone()[0]
+        pg_conn.commit()
+        cursor.close()
+        return profile_id
+
+
+@contextmanager
+def thread_profile():
+    """Profile this worker thread into the run's session (no-op if not profiling)"""
+    session = _session.get()
+    if session is None:
+        yield
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        session.add(profile)
+
+
+@contextmanager
+def maybe_profile(enabled, label):
+    """ProfileSession when enabled, else yields None"""
+    if not enabled:
+        yield None
+        return
+    with ProfileSession(label) as session:
+        yield session
@@ -0,0 +1,187 @@
+"""
+Column projection and row-filter pushdown for the MSSQL extract.
+
+A schedule may carry a column list and a WHERE predicate. Both end up in
+the SELECT sent to MSSQL, so unused columns and rows never leave the
+server. The predicate comes from chat users, so it is validated against a
+small T-SQL subset: column names, literals, comparison/logic operators and
+a whitelist of scalar functions. Anything else (subqueries, statements,
+comments, batch separators) is rejected.
+"""
+import re
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>N?'(?:[^']|'')*')
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<ident>\[(?:[^\]]|\]\])+\]|[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><>|!=|<=|>=|=|<|>|\+|-|\*|/|%)
+  | (?P<punct>[(),])
+""", re.VERBOSE)
+
+KEYWORDS = {
+    'AND', 'OR', 'NOT', 'IS', 'NULL', 'IN', 'LIKE', 'BETWEEN', 'ESCAPE', 'AS',
+}
+FUNCTIONS = {
+    'GETDATE', 'SYSDATETIME', 'GETUTCDATE', 'DATEADD', 'DATEDIFF', 'CAST',
+    'CONVERT', 'YEAR', 'MONTH', 'DAY', 'ISNULL', 'COALESCE', 'LEN', 'UPPER',
+    'LOWER', 'LTRIM', 'RTRIM',
+}
+# Bare words allowed as function arguments: DATEADD(day, ...), CAST(x AS date)
+DATEPARTS = {
+    'YEAR', 'QUARTER', 'MONTH', 'DAY', 'WEEK', 'HOUR', 'MINUTE', 'SECOND',
+    'YY', 'MM', 'DD', 'HH', 'MI', 'SS',
+}
+TYPES = {
+    'DATE', 'DATETIME', 'DATETIME2', 'TIME', 'INT', 'BIGINT', 'SMALLINT',
+    'DECIMAL', 'NUMERIC', 'VARCHAR', 'NVARCHAR', 'CHAR', 'NCHAR', 'BIT',
+}
+# Checked when the column list is not available (run-time re-validation)
+FORBIDDEN_WORDS = {
+    'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'DROP', 'EXEC', 'EXECUTE', 'UNION',
+    'INTO', 'ALTER', 'CREATE', 'TRUNCATE', 'MERGE', 'GRANT', 'REVOKE',
+    'DECLARE', 'WAITFOR', 'OPENROWSET', 'OPENQUERY', 'OPENDATASOURCE',
+    'SHUTDOWN', 'FROM', 'GO',
+}
+
+MAX_FILTER_LENGTH = 1000
+
+
+def quote_ident(name):
+    """Quote an MSSQL identifier: [name], with ] escaped"""
+    return '[' + name.replace(']', ']]') + ']'
+
+
+def _unquote_ident(token):
+    if token.startswith('['):
+        return token[1:-1].replace(']]', ']')
+    return token
+
+
+def validate_row_filter(predicate, allowed_columns=None):
+    """Check a WHERE predicate, returns it stripped. Raises ValueError.
+
+    allowed_columns (from the source table) makes the check strict: every
+    identifier that isn't a keyword/function/type must be one of them.
+    """
+    predicate = (predicate or '').strip()
+    if not predicate:
+        raise ValueError("Filter is empty")
+    if len(predicate) > MAX_FILTER_LENGTH:
+        raise ValueError(f"Filter longer than {MAX_FILTER_LENGTH} characters")
+
+    allowed = {c.lower() for c in allowed_columns} if allowed_columns is not None else None
+
+    tokens = []
+    pos = 0
+    while pos < len(predicate):
+        match = TOKEN_RE.match(predicate, pos)
+        if not match:
+            raise ValueError(f"Unexpected character '{predicate[pos]}' at position {pos}")
+        if match.lastgroup != 'space':
+            tokens.append((match.lastgroup, match.group(), pos))
+        pos = match.end()
+
+    depth = 0
+    for i, (kind, text, at) in enumerate(tokens):
+        next_text = tokens[i + 1][1] if i + 1 < len(tokens) else None
+
+        if kind == 'op' and text == '-' and next_text == '-' and tokens[i + 1][2] == at + 1:
+            raise ValueError("Comments are not allowed")
+        if kind == 'op' and text == '/' and next_text == '*' and tokens[i + 1][2] == at + 1:
+            raise ValueError("Comments are not allowed")
+
+        if kind == 'punct':
+            depth += {'(': 1, ')': -1}.get(text, 0)
+            if depth < 0:
+                raise ValueError("Unbalanced parentheses")
+            continue
+
+        if kind != 'ident':
+            continue
+
+        word = text.upper()
+        if text.startswith('['):
+            column = _unquote_ident(text)
+        elif word in KEYWORDS:
+            continue
+        elif next_text == '(':
+            if word not in FUNCTIONS:
+                raise ValueError(f"Function '{text}' is not allowed")
+            continue
+        elif word in DATEPARTS or word in TYPES:
+            continue
+        else:
+            column = text
+
+        if allowed is not None and column.lower() not in allowed:
+            raise ValueError(f"Unknown column '{column}'")
+        if allowed is None and column.upper() in FORBIDDEN_WORDS:
+            raise ValueError(f"'{column}' is not allowed in a filter")
+
+    if depth != 0:
+        raise ValueError("Unbalanced parentheses")
+
+    return predicate
+
+
+def validate_columns(columns, allowed_columns):
+    """Check a column list against the source columns, returns names in source case"""
+    by_lower = {c.lower(): c for c in allowed_columns}
+    result = []
+    for col in columns:
+        col = col.strip()
+        if not col:
+            continue
+        if col.lower() not in by_lower:
+            raise ValueError(f"Unknown column '{col}'")
+        if by_lower[col.lower()] not in result:
+            result.append(by_lower[col.lower()])
+    if not result:
+        raise ValueError("Column list is empty")
+    return result
+
+
+def build_select(schema, table, columns=None, row_filter=None):
+    """SELECT for the MSSQL extract with projection and filter pushed down
+
+    The filter is parenthesized, so callers can append "AND <condition>"
+    (partition key ranges) without an OR in the filter taking precedence.
+    """
+    select_list = ', '.join(quote_ident(c) for c in columns) if columns else '*'
+    query = f"SELECT {select_list} FROM {quote_ident(schema)}.{quote_ident(table)}"
+    if row_filter:
+        query += f" WHERE ({validate_row_filter(row_filter)})"
+    return query
+
+
+def get_source_columns(mssql_cursor, schema, table):
+    """Column names of the source table, in ordinal order"""
+    mssql_cursor.execute(
+        """SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS
+           WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?
+           ORDER BY ORDINAL_POSITION""",
+        (schema, table)
+    )
+    return [row[0] for row in mssql_cursor.fetchall()]
+
+
+def check_pushdown(mssql_cursor, schema, table, columns=None, row_filter=None):
+    """Validate projection/filter against the live source; returns (columns, row_filter)
+
+    Runs the final query with TOP 0 so MSSQL also type-checks the predicate.
+    """
+    source_columns = get_source_columns(mssql_cursor, schema, table)
+    if not source_columns:
+        raise ValueError(f"Source table {schema}.{table} not found")
+
+    if columns:
+        columns = validate_columns(columns, source_columns)
+    if row_filter:
+        row_filter = validate_row_filter(row_filter, source_columns)
+
+    query = build_select(schema, table, columns, row_filter)
+    mssql_cursor.execute(query.replace('SELECT ', 'SELECT TOP 0 ', 1))
+    mssql_cursor.fetchall()
+
+    return columns, row_filter
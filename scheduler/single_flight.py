@@ -0,0 +1,205 @@
+"""
+Single-flight syncs per target table.
+
+Only one transfer per target table runs at a time, across the scheduler and
+the bot. A second request for a table that is already being synced does not
+start another TRUNCATE + copy; it waits for the running one and gets its
+result.
+
+  - inside one process: a dict of in-flight runs, the followers wait on an
+    Event and receive the owner's return value directly
+  - across processes: a PostgreSQL advisory lock per table. The owner holds
+    it for the whole run and writes its result to public.sync_flights before
+    unlocking; a follower blocks on the lock, then reads that row.
+
+A run covers a set of PostgreSQL targets (fan-out schedules). A request only
+attaches to a run whose targets include every target it needs; otherwise
+it waits for that run to finish and then runs itself, so a sync of 'main'
+never reports the result of a run that only loaded 'reporting'.
+"""
+import logging
+import threading
+
+from fanout import MAIN_TARGET
+
+# First key of the two-int advisory lock, keeps our locks apart from others
+LOCK_NAMESPACE = 7311
+
+SYNC_FLIGHTS_DDL = """CREATE TABLE IF NOT EXISTS public.sync_flights (
+           target TEXT PRIMARY KEY,
+           run_id TEXT,
+           success BOOLEAN,
+           message TEXT,
+           records BIGINT,
+           finished_at TIMESTAMPTZ,
+           targets TEXT[]
+       )"""
+
+logger = logging.getLogger(__name__)
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.run_id = None
+        self.targets = frozenset()
+
+
+def flight_key(schema, table):
+    # Unquoted identifiers are case-insensitive in PostgreSQL
+    return f"{schema}.{table}".lower()
+
+
+def _target_set(targets):
+    return frozenset(t.lower() for t in targets) if targets else frozenset([MAIN_TARGET])
+
+
+def publish_result(cursor, key, run_id, success, message, records, targets=None):
+    """Record the outcome of a run (and the targets it loaded) for followers in other processes"""
+    cursor.execute(
+        """INSERT INTO public.sync_flights (target, run_id, success, message, records, finished_at, targets)
+           VALUES (%s, %s, %s, %s, %s, clock_timestamp(), %s)
+           ON CONFLICT (target) DO UPDATE
+           SET run_id = EXCLUDED.run_id, success = EXCLUDED.success, message = EXCLUDED.message,
+               records = EXCLUDED.records, finished_at = EXCLUDED.finished_at,
+               targets = EXCLUDED.targets""",
+        (key, run_id, success, message, records, sorted(_target_set(targets)))
+    )
+
+
+def _run_with_advisory_lock(key, fn, pg_connect, run_id, targets, attempts=3):
+    """Returns (result, attached_run_id). attached_run_id is None if we ran fn."""
+    conn = pg_connect()
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        failed_attempts = 0
+        while failed_attempts < attempts:
+            cursor.execute("SELECT clock_timestamp()")
+            requested_at = cursor.fetchone()[0]
+
+            cursor.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s))", (LOCK_NAMESPACE, key))
+            if cursor.fetchone()[0]:
+                try:
+                    result = fn()
+                    success, message, records = result[0], result[1], result[2]
+                    publish_result(cursor, key, run_id, success, message, records, targets)
+                    return result, None
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", (LOCK_NAMESPACE, key))
+
+            logger.info(f"Sync of {key} already running in another process, waiting for its result")
+            cursor.execute("SELECT pg_advisory_lock(%s, hashtext(%s))", (LOCK_NAMESPACE, key))
+            cursor.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", (LOCK_NAMESPACE, key))
+
+            cursor.execute(
+                """SELECT run_id, success, message, records, targets FROM public.sync_flights
+                   WHERE target = %s AND finished_at >= %s""",
+                (key, requested_at)
+            )
+            row = cursor.fetchone()
+            if row:
+                other_run_id, success, message, records, other_targets = row
+                if _target_set(other_targets) >= targets:
+                    return (success, message, records), other_run_id
+                # It loaded other targets only: now that it is done, run ourselves
+                logger.info(f"Run {other_run_id} of {key} didn't cover {', '.join(sorted(targets))}, "
+                            f"running it now")
+                continue
+
+            # The other process died without publishing, try to run it ourselves
+            failed_attempts += 1
+            logger.warning(f"Sync of {key} ended without a result, retrying")
+
+        raise RuntimeError(f"Could not acquire sync lock for {key}")
+    finally:
+        conn.close()
+
+
+def run_single_flight(schema, table, fn, pg_connect, run_id=None, targets=None):
+    """Run fn() unless a sync of schema.table covering `targets` is already in flight.
+
+    targets are the PostgreSQL targets fn loads (default: main only).
+    fn must return a tuple starting with (success, message, records).
+    Returns (result, attached_run_id): attached_run_id is None when this call
+    did the work; otherwise result comes from the run we attached to and only
+    holds (success, message, records).
+    """
+    key = flight_key(schema, table)
+    targets = _target_set(targets)
+
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = _Flight()
+                flight.run_id = run_id
+                flight.targets = targets
+                _flights[key] = flight
+
+        if owner:
+            break
+
+        covered = flight.targets >= targets
+        if covered:
+            logger.info(f"Sync of {key} already running in this process, attaching")
+        else:
+            logger.info(f"Sync of {key} to {', '.join(sorted(flight.targets))} running in this "
+                        f"process, waiting to load {', '.join(sorted(targets))}")
+        flight.done.wait()
+        if covered:
+            if flight.error is not None:
+                raise flight.error
+            return flight.result[:3], flight.run_id
+
+    try:
+        result, attached_run_id = _run_with_advisory_lock(key, fn, pg_connect, run_id, targets)
+        flight.result = result
+        flight.run_id = attached_run_id or run_id
+        return result, attached_run_id
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+        flight.done.set()
+
+
+class TableLocks:
+    """Block until advisory locks for all tables are held (sorted, no deadlock)
+
+    Used by job groups, which must own every member for the whole group.
+    Results are published per member before the locks are released.
+    """
+
+    def __init__(self, pg_connect, tables):
+        self.pg_connect = pg_connect
+        self.keys = sorted({flight_key(schema, table) for schema, table in tables})
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pg_connect()
+        self.conn.autocommit = True
+        cursor = self.conn.cursor()
+        for key in self.keys:
+            cursor.execute("SELECT pg_advisory_lock(%s, hashtext(%s))", (LOCK_NAMESPACE, key))
+        return self
+
+    def publish(self, schema, table, run_id, success, message, records):
+        publish_result(self.conn.cursor(), flight_key(schema, table), run_id, success, message, records)
+
+    def __exit__(self, *exc):
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT pg_advisory_unlock_all()")
+        finally:
+            self.conn.close()
+        return False
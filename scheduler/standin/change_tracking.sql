@@ -0,0 +1,58 @@
+-- Local stand-in source for the change_tracking strategy.
+--
+--   docker compose --profile standin up -d mssql-standin
+--   docker exec -i sync-mssql-standin /opt/mssql-tools18/bin/sqlcmd -C -S localhost \
+--       -U sa -P "$MSSQL_SA_PASSWORD" < scheduler/standin/change_tracking.sql
+--
+-- Point DB_HOST_TARGET/DB_PORT_TARGET (1433)/DB_NAME_TARGET=SyncStandin/
+-- DB_USER_TARGET=sa at it, create demo.orders (id PRIMARY KEY) on
+-- PostgreSQL and add a schedule for demo.orders. The first run is a full
+-- load; run the "changes" block below and the next run applies them as
+-- upserts and deletes.
+
+IF DB_ID('SyncStandin') IS NULL
+    CREATE DATABASE SyncStandin;
+GO
+
+USE SyncStandin;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.change_tracking_databases WHERE database_id = DB_ID())
+    ALTER DATABASE SyncStandin
+    SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 2 DAYS, AUTO_CLEANUP = ON);
+GO
+
+IF SCHEMA_ID('demo') IS NULL
+    EXEC('CREATE SCHEMA demo');
+GO
+
+IF OBJECT_ID('demo.orders') IS NULL
+BEGIN
+    CREATE TABLE demo.orders (
+        id INT NOT NULL PRIMARY KEY,
+        customer NVARCHAR(100) NOT NULL,
+        amount DECIMAL(12, 2) NOT NULL,
+        updated_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+    ALTER TABLE demo.orders ENABLE CHANGE_TRACKING;
+
+    INSERT INTO demo.orders (id, customer, amount)
+    SELECT TOP (1000) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)),
+           CONCAT('customer-', ABS(CHECKSUM(NEWID())) % 50),
+           ABS(CHECKSUM(NEWID())) % 100000 / 100.0
+    FROM sys.all_objects;
+END
+GO
+
+-- Changes: run after the first sync (insert, update, delete, and a row
+-- inserted then deleted, which CHANGETABLE reports as a single delete)
+/*
+INSERT INTO demo.orders (id, customer, amount) VALUES (5001, 'customer-new', 10.00);
+UPDATE demo.orders SET amount = amount + 1, updated_at = SYSDATETIME() WHERE id BETWEEN 1 AND 10;
+DELETE FROM demo.orders WHERE id BETWEEN 11 AND 20;
+INSERT INTO demo.orders (id, customer, amount) VALUES (5002, 'customer-gone', 1.00);
+DELETE FROM demo.orders WHERE id = 5002;
+
+SELECT CHANGE_TRACKING_CURRENT_VERSION() AS current_version,
+       CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('demo.orders')) AS min_valid_version;
+*/
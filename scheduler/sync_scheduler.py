@@ -1,27 +1,45 @@
 #!/usr/bin/env python3
 import os
-import sys
 import logging
 import uuid
 from datetime import datetime, timedelta
 from decimal import Decimal
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json
 import pyodbc
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from flow_control import BatchSizer
+from job_groups import parse_table_list, run_job_group
+from cron import CronExpression, spread_start
+from pushdown import build_select, quote_ident, get_source_columns
+import planner
+from bulk_load import LoadPhase, DEFERRED_OBJECTS_DDL
+from single_flight import run_single_flight, TableLocks, SYNC_FLIGHTS_DDL
+from profiling import PROFILES_DDL, maybe_profile, thread_profile
+from cancellation import (JobWatch, SYNC_JOBS_DDL, current_token,
+                          track_pg, track_mssql, prune_stale_jobs)
+from fanout import MAIN_TARGET, TargetWriter, fan_out, target_dsn
+from pipeline import run_pipeline
+import log_pipeline
+from log_pipeline import LogSampler, log_context, get_log_context, new_run_id
 
 # Setup logging - Docker path
 LOG_FILE = '/app/logs/sync_scheduler.log'
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
+def setup_logging():
+    """Configure logging when running as the scheduler entrypoint.
+
+    Kept out of import time so the bot can import this module as the
+    shared sync engine without writing to the scheduler log file.
+    JSON lines go to LOG_FILE (size-rotated) through a background queue.
+    stdout ends up in the unrotated cron.log, so it only gets warnings/errors.
+    """
+    log_pipeline.setup_logging(LOG_FILE, stdout_level=logging.WARNING)
+
 # Database configs
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', ''),
@@ -40,8 +58,86 @@ MSSQL_CONFIG = {
     'password': os.getenv('DB_PASSWORD_TARGET', '')
 }
 
+# Columns added on top of the original public.schedules / public.sync_logs
+# tables, created on first run by ensure_schema()
+SCHEMA_COLUMNS = [
+    ('schedules', 'table_list', 'TEXT[]'),
+    ('schedules', 'recurring', 'BOOLEAN DEFAULT FALSE'),
+    ('schedules', 'next_run', 'TIMESTAMP'),
+    ('schedules', 'spread_minutes', 'INTEGER DEFAULT 0'),
+    ('schedules', 'column_list', 'TEXT[]'),
+    ('schedules', 'row_filter', 'TEXT'),
+    ('schedules', 'profile', 'BOOLEAN DEFAULT FALSE'),
+    ('schedules', 'max_runtime_minutes', 'INTEGER'),
+    ('schedules', 'targets', 'TEXT[]'),
+    ('sync_logs', 'strategy', 'TEXT'),
+    ('sync_logs', 'plan_reason', 'TEXT'),
+    ('sync_logs', 'phase_timings', 'JSONB'),
+    ('sync_logs', 'run_id', 'TEXT'),
+    ('sync_logs', 'target_db', 'TEXT'),
+    ('sync_state', 'ct_version', 'BIGINT'),
+    ('sync_jobs', 'heartbeat_at', 'TIMESTAMP DEFAULT NOW()'),
+    ('sync_flights', 'targets', 'TEXT[]'),
+]
+
+# Tables (and indexes) owned by the scheduler, created on first run by ensure_schema()
+SCHEMA_TABLES = [
+    """CREATE TABLE IF NOT EXISTS public.sync_state (
+           source_schema TEXT NOT NULL,
+           source_table TEXT NOT NULL,
+           rowversion BYTEA,
+           last_full_at TIMESTAMP,
+           updated_at TIMESTAMP DEFAULT NOW(),
+           PRIMARY KEY (source_schema, source_table)
+       )""",
+    DEFERRED_OBJECTS_DDL,
+    SYNC_FLIGHTS_DDL,
+    PROFILES_DDL,
+    SYNC_JOBS_DDL,
+    # Keyset pagination + name prefix filter in the bot (/schedule, /info)
+    'CREATE INDEX IF NOT EXISTS schedules_name_c_idx ON public.schedules (name COLLATE "C")',
+]
+
+# Assumed run time for schedules without sync history (load-aware spreading)
+DEFAULT_DURATION_SECONDS = 300
+
 def get_pg_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    # Registered with the running job so a cancel can interrupt its statements
+    return track_pg(psycopg2.connect(**DB_CONFIG))
+
+def get_target_connection(name):
+    """Connection to a named PostgreSQL target ('main' = DB_CONFIG)"""
+    if name == MAIN_TARGET:
+        return get_pg_connection()
+    dsn = target_dsn(name)
+    if not dsn:
+        raise ValueError(f"Target '{name}' is not configured in SYNC_TARGETS")
+    return track_pg(psycopg2.connect(dsn))
+
+def ensure_schema():
+    """Add missing SCHEMA_COLUMNS (checked first, so no DDL lock on every run), prune stale jobs"""
+    conn = get_pg_connection()
+    try:
+        cursor = conn.cursor()
+        for ddl in SCHEMA_TABLES:
+            cursor.execute(ddl)
+        cursor.execute(
+            """SELECT table_name, column_name FROM information_schema.columns
+               WHERE table_schema = 'public'"""
+        )
+        existing = set(cursor.fetchall())
+        for table, column, col_type in SCHEMA_COLUMNS:
+            if (table, column) not in existing:
+                logger.info(f"Adding column public.{table}.{column}")
+                cursor.execute(
+                    f"ALTER TABLE public.{table} ADD COLUMN IF NOT EXISTS {column} {col_type}"
+                )
+        conn.commit()
+        cursor.close()
+        # Jobs of crashed/killed processes, so /sync jobs and cancel don't see them
+        prune_stale_jobs(conn)
+    finally:
+        conn.close()
 
 def get_mssql_connection():
     """Connect to MSSQL using pyodbc"""
@@ -54,7 +150,13 @@ def get_mssql_connection():
         f"PWD={MSSQL_CONFIG['password']};"
         f"TDS_Version=7.4;"
     )
-    return pyodbc.connect(conn_str)
+    conn = pyodbc.connect(conn_str)
+    # Extract statements of a job with a max runtime time out with it
+    token = current_token()
+    remaining = token.remaining_seconds() if token else None
+    if remaining is not None and remaining > 0:
+        conn.timeout = int(remaining) + 1
+    return conn
 
 def convert_value(val):
     """Convert special types for PostgreSQL"""
@@ -69,90 +171,553 @@ def convert_value(val):
     else:
         return val
 
-def sync_table(schema, table, schedule_name):
-    """Sync one table from MSSQL to PostgreSQL"""
+def build_insert(schema, table, columns, conflict_key=None):
+    """INSERT for the PostgreSQL target; with conflict_key it becomes an upsert"""
+    columns_str = ', '.join([f'"{col}"' for col in columns])
+    placeholders = ', '.join(['%s'] * len(columns))
+    query = f"INSERT INTO {schema}.{table} ({columns_str}) VALUES ({placeholders})"
+    
+    if conflict_key:
+        key_str = ', '.join([f'"{col}"' for col in conflict_key])
+        updates = [f'"{col}" = EXCLUDED."{col}"' for col in columns if col not in conflict_key]
+        if updates:
+            query += f" ON CONFLICT ({key_str}) DO UPDATE SET {', '.join(updates)}"
+        else:
+            query += f" ON CONFLICT ({key_str}) DO NOTHING"
+    
+    return query
+
+def copy_rows(mssql_cursor, pg_conn, insert_query, schedule_name, before_first_batch=None):
+    """Stream an executed MSSQL cursor into PostgreSQL, returns rows copied
+
+    Rows are fetched in batches sized by BatchSizer. Each batch reserves
+    its estimated size in the shared MEMORY_BUDGET from fetch until it is
+    loaded, so concurrent syncs stay under one budget. Fetch, conversion
+    and load run as overlapping pipeline stages (see pipeline.py).
+    before_first_batch(pg_cursor) runs once, only if the source returned rows.
+    """
+    sizer = BatchSizer()
+    sampler = LogSampler()
+    pg_cursor = pg_conn.cursor()
+    progress = {'records': 0, 'batches': 0}
+    
+    def convert(rows):
+        return [tuple(convert_value(val) for val in row) for row in rows]
+    
+    def load(values):
+        if progress['batches'] == 0 and before_first_batch:
+            before_first_batch(pg_cursor)
+        
+        # Insert batch to PostgreSQL
+        pg_cursor.executemany(insert_query, values)
+        pg_conn.commit()
+        
+        progress['records'] += len(values)
+        progress['batches'] += 1
+        if sampler.should_log():
+            logger.info(
+                f"[{schedule_name}] Inserted batch {progress['batches']}: {len(values)} rows "
+                f"({progress['records']} total, next batch {sizer.next_batch_rows()} rows)"
+            )
+    
+    records_count = run_pipeline(mssql_cursor.fetchmany, convert, load, sizer, schedule_name)
+    
+    pg_cursor.close()
+    if progress['batches']:
+        logger.info(f"[{schedule_name}] Copied {records_count} rows in {progress['batches']} batches")
+    return records_count
+
+def build_delete(schema, table, key):
+    """DELETE of one row by key on the PostgreSQL target"""
+    condition = ' AND '.join(f'"{col}" = %s' for col in key)
+    return f"DELETE FROM {schema}.{table} WHERE {condition}"
+
+def apply_changes(mssql_cursor, pg_conn, upsert_query, delete_query, key_count, schedule_name):
+    """Apply a Change Tracking result set in batches, returns (upserted, deleted)
+
+    Rows are (present, key..., column...). present = 0 means the row is gone
+    on the source (deleted, or deleted again after an insert/update) and the
+    key is deleted on the target; otherwise the current row is upserted.
+    CHANGETABLE returns one net change per key, so order within a batch
+    doesn't matter. Runs through the same fetch/convert/load pipeline as
+    copy_rows().
+    """
+    sizer = BatchSizer()
+    sampler = LogSampler()
+    pg_cursor = pg_conn.cursor()
+    progress = {'upserted': 0, 'deleted': 0, 'batches': 0}
+
+    def convert(rows):
+        # (present, values): the row to upsert, or the key to delete
+        return [(True, tuple(convert_value(val) for val in row[1 + key_count:])) if row[0]
+                else (False, tuple(convert_value(val) for val in row[1:1 + key_count]))
+                for row in rows]
+
+    def load(changes):
+        upserts = [values for present, values in changes if present]
+        deletes = [values for present, values in changes if not present]
+        if deletes:
+            pg_cursor.executemany(delete_query, deletes)
+        if upserts:
+            pg_cursor.executemany(upsert_query, upserts)
+        pg_conn.commit()
+
+        progress['upserted'] += len(upserts)
+        progress['deleted'] += len(deletes)
+        progress['batches'] += 1
+        if sampler.should_log():
+            logger.info(
+                f"[{schedule_name}] Applied change batch {progress['batches']}: {len(upserts)} upserts, "
+                f"{len(deletes)} deletes ({progress['upserted'] + progress['deleted']} total)"
+            )
+
+    run_pipeline(mssql_cursor.fetchmany, convert, load, sizer, schedule_name)
+
+    pg_cursor.close()
+    upserted, deleted = progress['upserted'], progress['deleted']
+    if progress['batches']:
+        logger.info(f"[{schedule_name}] Applied {upserted} upserts, {deleted} deletes "
+                    f"in {progress['batches']} batches")
+    return upserted, deleted
+
+def close_quietly(*conns):
+    for conn in conns:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+def finish_load_phase(phase, schedule_name):
+    """Restore indexes/triggers after a failed load, without masking the error
+
+    Also retries a finish() that failed on the success path: indexes that
+    couldn't be rebuilt are still recorded and get another attempt here.
+    """
+    if phase.prepared and not phase.finished:
+        try:
+            phase.finish(vacuum=False)
+        except Exception as e:
+            logger.error(f"[{schedule_name}] Error restoring indexes/triggers: {e}")
+
+def forget_watermark(schema, table, schedule_name):
+    """A failed/cancelled full reload leaves a partial target: next run must be full"""
+    try:
+        conn = get_pg_connection()
+        try:
+            planner.invalidate_sync_state(conn, schema, table)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Error resetting sync state: {e}")
+
+def sync_table(schema, table, schedule_name, truncate=True, columns=None, row_filter=None,
+               timings=None, into=None):
+    """Sync one table from MSSQL to PostgreSQL (full truncate + reload)
+
+    into = (schema, table) loads a job group member into its staging table
+    instead (no truncate, no index/trigger deferral; the group swaps it in later).
+    columns / row_filter are pushed down into the MSSQL SELECT.
+    Secondary indexes and user triggers are deferred for the load (LoadPhase);
+    step timings go into `timings` when given.
+    """
     start_time = datetime.now()
+    mssql_conn = None
+    pg_conn = None
+    phase = LoadPhase(get_pg_connection, schema, table,
+                      timings if timings is not None else {}, schedule_name)
     
     try:
         logger.info(f"[{schedule_name}] Starting sync: {schema}.{table}")
         
-        # 1. Get data from MSSQL
+        # 1. Open MSSQL cursor
         mssql_conn = get_mssql_connection()
-        mssql_cursor = mssql_conn.cursor()
+        mssql_cursor = track_mssql(mssql_conn.cursor())
         
-        query = f"SELECT * FROM [{schema}].[{table}]"
+        query = build_select(schema, table, columns, row_filter)
+        if columns or row_filter:
+            logger.info(f"[{schedule_name}] Pushdown query: {query}")
         mssql_cursor.execute(query)
         
         # Get column names
         columns = [column[0] for column in mssql_cursor.description]
+        insert_query = build_insert(*(into or (schema, table)), columns)
+        
+        # 2. Truncate PostgreSQL once the source has returned data,
+        #    then drop secondary indexes / disable triggers for the load
+        def prepare_target(pg_cursor):
+            if into:
+                return
+            if truncate:
+                pg_cursor.execute(f"TRUNCATE TABLE {schema}.{table} CASCADE")
+                pg_conn.commit()
+                logger.info(f"[{schedule_name}] Truncated {schema}.{table}")
+            phase.prepare()
         
-        # Fetch all rows
-        rows = mssql_cursor.fetchall()
+        # 3. Fetch, convert and insert in batches
+        pg_conn = get_pg_connection()
+        records_count = copy_rows(mssql_cursor, pg_conn, insert_query, schedule_name,
+                                  prepare_target)
         
-        mssql_cursor.close()
-        mssql_conn.close()
+        # 4. Rebuild indexes, enable triggers, ANALYZE
+        if phase.prepared:
+            phase.finish()
         
-        if not rows:
+        if records_count == 0:
             logger.info(f"[{schedule_name}] Table is empty")
             return True, "Table is empty", 0
         
-        records_count = len(rows)
-        logger.info(f"[{schedule_name}] Fetched {records_count} records from MSSQL")
+        duration = int((datetime.now() - start_time).total_seconds())
+        logger.info(f"[{schedule_name}] Completed: {records_count} records in {duration}s")
+        
+        return True, f"Synced {records_count} records in {duration}s", records_count
+        
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Error: {e}", exc_info=True)
+        close_quietly(mssql_conn, pg_conn)
+        finish_load_phase(phase, schedule_name)
+        forget_watermark(schema, table, schedule_name)
+        return False, str(e), 0
+    
+    finally:
+        close_quietly(mssql_conn, pg_conn)
+
+def sync_table_incremental(schema, table, schedule_name, plan):
+    """Upsert rows whose rowversion is >= the watermark of the previous run"""
+    start_time = datetime.now()
+    mssql_conn = None
+    pg_conn = None
+    rv_col = plan.source['rowversion_column']
+    key = [name for name, _ in plan.source['key_columns']]
+    
+    try:
+        logger.info(f"[{schedule_name}] Starting incremental sync: {schema}.{table}")
+        
+        mssql_conn = get_mssql_connection()
+        mssql_cursor = track_mssql(mssql_conn.cursor())
+        mssql_cursor.execute(
+            f"{build_select(schema, table)} WHERE {quote_ident(rv_col)} >= ?",
+            (plan.state['rowversion'],)
+        )
         
-        # 2. Convert data
-        converted_rows = []
-        for row in rows:
-            converted_row = {col: convert_value(val) for col, val in zip(columns, row)}
-            converted_rows.append(converted_row)
+        columns = [column[0] for column in mssql_cursor.description]
+        insert_query = build_insert(schema, table, columns, conflict_key=key)
         
-        # 3. Truncate PostgreSQL
         pg_conn = get_pg_connection()
-        pg_cursor = pg_conn.cursor()
+        records_count = copy_rows(mssql_cursor, pg_conn, insert_query, schedule_name)
         
-        truncate_query = f"TRUNCATE TABLE {schema}.{table} CASCADE"
-        pg_cursor.execute(truncate_query)
-        pg_conn.commit()
+        duration = int((datetime.now() - start_time).total_seconds())
+        logger.info(f"[{schedule_name}] Completed: {records_count} changed records in {duration}s")
         
-        logger.info(f"[{schedule_name}] Truncated {schema}.{table}")
+        return True, f"Upserted {records_count} changed records in {duration}s", records_count
         
-        # 4. Insert to PostgreSQL
-        columns_str = ', '.join([f'"{col}"' for col in columns])
-        placeholders = ', '.join(['%s'] * len(columns))
-        insert_query = f"INSERT INTO {schema}.{table} ({columns_str}) VALUES ({placeholders})"
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Error: {e}", exc_info=True)
+        return False, str(e), 0
+    
+    finally:
+        close_quietly(mssql_conn, pg_conn)
+
+def sync_table_changes(schema, table, schedule_name, plan):
+    """Apply SQL Server Change Tracking changes since the stored version
+
+    Inserts/updates are upserted on the key, deletes are deleted. The new
+    version (read at planning time, before this extract) is stored by the
+    caller once the run succeeds; a failed run re-applies from the old one.
+    """
+    start_time = datetime.now()
+    mssql_conn = None
+    pg_conn = None
+    key = [name for name, _ in plan.source['key_columns']]
+    since = plan.state['ct_version']
+
+    try:
+        logger.info(f"[{schedule_name}] Starting change tracking sync: {schema}.{table} "
+                    f"from version {since}")
+
+        mssql_conn = get_mssql_connection()
+        mssql_cursor = track_mssql(mssql_conn.cursor())
+
+        columns = get_source_columns(mssql_cursor, schema, table)
+        source = f"{quote_ident(schema)}.{quote_ident(table)}"
+        join = ' AND '.join(f"t.{quote_ident(col)} = ct.{quote_ident(col)}" for col in key)
+        mssql_cursor.execute(
+            f"""SELECT CASE WHEN t.{quote_ident(key[0])} IS NULL THEN 0 ELSE 1 END,
+                       {', '.join(f'ct.{quote_ident(col)}' for col in key)},
+                       {', '.join(f't.{quote_ident(col)}' for col in columns)}
+                FROM CHANGETABLE(CHANGES {source}, ?) AS ct
+                LEFT JOIN {source} AS t ON {join}""",
+            (since,)
+        )
+
+        pg_conn = get_pg_connection()
+        upserted, deleted = apply_changes(
+            mssql_cursor, pg_conn,
+            build_insert(schema, table, columns, conflict_key=key),
+            build_delete(schema, table, key),
+            len(key), schedule_name
+        )
+
+        duration = int((datetime.now() - start_time).total_seconds())
+        logger.info(f"[{schedule_name}] Completed: {upserted} upserts, {deleted} deletes in {duration}s")
+
+        return (True, f"Applied {upserted} upserts and {deleted} deletes in {duration}s",
+                upserted + deleted)
+
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Error: {e}", exc_info=True)
+        return False, str(e), 0
+
+    finally:
+        close_quietly(mssql_conn, pg_conn)
+
+def sync_table_partitioned(schema, table, schedule_name, plan, columns=None, row_filter=None):
+    """Full reload with the key range split over parallel extract/load workers"""
+    start_time = datetime.now()
+    key_column = plan.source['key_columns'][0][0]
+    phase = LoadPhase(get_pg_connection, schema, table, plan.phases, schedule_name)
+    
+    def copy_partition(index, low, high):
+        mssql_conn = None
+        pg_conn = None
+        try:
+            with thread_profile():
+                mssql_conn = get_mssql_connection()
+                mssql_cursor = track_mssql(mssql_conn.cursor())
+            
+                condition = f"{quote_ident(key_column)} >= ?"
+                params = [low]
+                if high is not None:
+                    condition += f" AND {quote_ident(key_column)} < ?"
+                    params.append(high)
+                query = build_select(schema, table, columns, row_filter)
+                query += f" AND {condition}" if row_filter else f" WHERE {condition}"
+                mssql_cursor.execute(query, params)
+            
+                insert_query = build_insert(schema, table, [c[0] for c in mssql_cursor.description])
+                pg_conn = get_pg_connection()
+                return copy_rows(mssql_cursor, pg_conn, insert_query, f"{schedule_name}#{index}")
+        finally:
+            close_quietly(mssql_conn, pg_conn)
+    
+    try:
+        logger.info(
+            f"[{schedule_name}] Starting partitioned sync: {schema}.{table} "
+            f"({len(plan.partitions)} ranges on {key_column})"
+        )
         
-        batch_size = 1000
-        for i in range(0, len(converted_rows), batch_size):
-            batch = converted_rows[i:i + batch_size]
-            values = [tuple(row[col] for col in columns) for row in batch]
-            pg_cursor.executemany(insert_query, values)
+        pg_conn = get_pg_connection()
+        try:
+            pg_conn.cursor().execute(f"TRUNCATE TABLE {schema}.{table} CASCADE")
             pg_conn.commit()
-            logger.info(f"[{schedule_name}] Inserted batch {i//batch_size + 1}/{(len(converted_rows)//batch_size)+1}")
+        finally:
+            pg_conn.close()
+        logger.info(f"[{schedule_name}] Truncated {schema}.{table}")
+        phase.prepare()
+        
+        with ThreadPoolExecutor(max_workers=len(plan.partitions)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, copy_partition, i + 1, low, high)
+                       for i, (low, high) in enumerate(plan.partitions)]
+            records_count = sum(f.result() for f in futures)
         
-        pg_cursor.close()
-        pg_conn.close()
+        phase.finish()
         
         duration = int((datetime.now() - start_time).total_seconds())
         logger.info(f"[{schedule_name}] Completed: {records_count} records in {duration}s")
         
-        return True, f"Synced {records_count} records in {duration}s", records_count
+        return True, f"Synced {records_count} records in {duration}s ({len(plan.partitions)} partitions)", records_count
         
     except Exception as e:
         logger.error(f"[{schedule_name}] Error: {e}", exc_info=True)
+        finish_load_phase(phase, schedule_name)
+        forget_watermark(schema, table, schedule_name)
         return False, str(e), 0
 
-def update_schedule_status(schedule_name, status, message):
-    """Update schedule status"""
+def sync_table_fanout(schema, table, schedule_name, targets, columns=None, row_filter=None):
+    """Full reload of one table into several targets from a single MSSQL extract
+
+    Every target is truncated when the first batch reaches it and gets its
+    own LoadPhase. Returns (success, message, records, results) where
+    results maps target -> (status, message, records, timings).
+    """
+    start_time = datetime.now()
+    mssql_conn = None
+    phases = {}
+    results = {}
+    writers = []
+    
+    def prepare_target(name, pg_conn, pg_cursor):
+        pg_cursor.execute(f"TRUNCATE TABLE {schema}.{table} CASCADE")
+        if name != MAIN_TARGET:
+            # ensure_schema() only runs against main
+            pg_cursor.execute(DEFERRED_OBJECTS_DDL)
+        pg_conn.commit()
+        logger.info(f"[{schedule_name}->{name}] Truncated {schema}.{table}")
+        phases[name].prepare()
+    
+    try:
+        logger.info(f"[{schedule_name}] Starting fan-out sync: {schema}.{table} -> {', '.join(targets)}")
+        
+        mssql_conn = get_mssql_connection()
+        mssql_cursor = track_mssql(mssql_conn.cursor())
+        mssql_cursor.execute(build_select(schema, table, columns, row_filter))
+        insert_query = build_insert(schema, table, [c[0] for c in mssql_cursor.description])
+        
+        for name in targets:
+            connect = lambda name=name: get_target_connection(name)
+            phases[name] = LoadPhase(connect, schema, table, {}, f"{schedule_name}->{name}")
+            writers.append(TargetWriter(name, connect, insert_query, schedule_name, prepare_target))
+        
+        extracted = fan_out(mssql_cursor, writers, schedule_name, convert_value)
+        
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Error: {e}", exc_info=True)
+        # Batches a target committed before the error stay loaded, report them
+        loaded = {writer.name: writer.records for writer in writers}
+        for name in targets:
+            if name in phases:
+                finish_load_phase(phases[name], schedule_name)
+            results[name] = (run_status(False), str(e), loaded.get(name, 0),
+                             phases[name].timings if name in phases else {})
+        if MAIN_TARGET in targets:
+            forget_watermark(schema, table, schedule_name)
+        return False, str(e), 0, results
+    
+    finally:
+        close_quietly(mssql_conn)
+    
+    duration = int((datetime.now() - start_time).total_seconds())
+    for writer in writers:
+        phase = phases[writer.name]
+        if writer.error is None:
+            try:
+                if phase.prepared:
+                    phase.finish()
+                results[writer.name] = ('success', f"Synced {writer.records} records in {duration}s",
+                                        writer.records, phase.timings)
+                continue
+            except Exception as e:
+                writer.error = e
+        finish_load_phase(phase, schedule_name)
+        results[writer.name] = (run_status(False), str(writer.error), writer.records, phase.timings)
+    
+    # The fan-out path has no watermark; main's next run plans from scratch
+    if MAIN_TARGET in targets:
+        forget_watermark(schema, table, schedule_name)
+    
+    failed = [name for name, result in results.items() if result[0] != 'success']
+    summary = ', '.join(f"{name}: {result[0]} ({result[2]})" for name, result in results.items())
+    logger.info(f"[{schedule_name}] Fan-out of {extracted} rows finished: {summary}")
+    if failed:
+        return False, f"Failed on {', '.join(failed)} - {summary}", extracted, results
+    return True, f"Synced {extracted} records to {len(results)} targets in {duration}s", extracted, results
+
+def make_plan(schema, table, columns=None, row_filter=None):
+    """Plan a sync without running it (also used by the bot's /sync plan)"""
+    mssql_conn = get_mssql_connection()
+    pg_conn = get_pg_connection()
+    try:
+        return planner.plan_sync(mssql_conn, pg_conn, schema, table, columns, row_filter)
+    finally:
+        close_quietly(mssql_conn, pg_conn)
+
+def run_planned_sync(schema, table, schedule_name, columns=None, row_filter=None):
+    """Plan, then sync with the chosen strategy. Returns (success, message, records, plan)
+
+    Only one sync per target table runs at a time (scheduler and bot alike).
+    If one is already in flight this waits for it and returns its result
+    with an ATTACHED plan instead of loading the table a second time.
+    """
+    with log_context(schedule=schedule_name, table=f"{schema}.{table}"):
+        result, attached_run_id = run_single_flight(
+            schema, table,
+            lambda: _run_planned_sync(schema, table, schedule_name, columns, row_filter),
+            get_pg_connection,
+            run_id=get_log_context().get('run_id')
+        )
+        if attached_run_id is None:
+            return result
+        
+        success, message, records = result
+        logger.info(f"[{schedule_name}] Attached to run {attached_run_id} of {schema}.{table}: {message}")
+        plan = planner.SyncPlan(planner.ATTACHED, f"Joined run {attached_run_id} already in progress")
+        return success, message, records, plan
+
+def _run_planned_sync(schema, table, schedule_name, columns, row_filter):
+    try:
+        plan = make_plan(schema, table, columns, row_filter)
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Planning failed, falling back to full sync: {e}")
+        plan = planner.SyncPlan(planner.FULL, f"Planning failed: {e}")
+    
+    logger.info(f"[{schedule_name}] Plan for {schema}.{table}: {plan.strategy} - {plan.reason}")
+    
+    if plan.strategy == planner.SKIP:
+        return True, f"Skipped: {plan.reason}", 0, plan
+    
+    if plan.strategy == planner.CHANGE_TRACKING:
+        success, message, records = sync_table_changes(schema, table, schedule_name, plan)
+    elif plan.strategy == planner.INCREMENTAL:
+        success, message, records = sync_table_incremental(schema, table, schedule_name, plan)
+    elif plan.strategy == planner.PARTITIONED:
+        success, message, records = sync_table_partitioned(
+            schema, table, schedule_name, plan, columns, row_filter)
+    else:
+        success, message, records = sync_table(
+            schema, table, schedule_name, columns=columns, row_filter=row_filter,
+            timings=plan.phases)
+    
+    # Watermark is MIN_ACTIVE_ROWVERSION (and the Change Tracking version)
+    # read before the extract started.
+    # Filtered/projected loads don't hold the full table, so they reset it.
+    if success:
+        try:
+            pg_conn = get_pg_connection()
+            try:
+                watermark = None
+                ct_version = None
+                if not (columns or row_filter):
+                    watermark = plan.source.get('min_active_rowversion')
+                    ct_version = plan.source.get('ct_current_version')
+                planner.save_sync_state(pg_conn, schema, table, watermark,
+                                        plan.strategy not in (planner.INCREMENTAL, planner.CHANGE_TRACKING),
+                                        ct_version)
+            finally:
+                pg_conn.close()
+        except Exception as e:
+            logger.error(f"[{schedule_name}] Error saving sync state: {e}")
+    
+    return success, message, records, plan
+
+def update_schedule_status(schedule_name, status, message, next_run=None, recurring=False):
+    """Update schedule status
+
+    Recurring schedules pass next_run: they go back to 'active' with the
+    next fire time instead of ending as 'completed'/'failed'. A recurring
+    schedule without next_run also stays 'active' (next_run NULL), so the
+    next tick plans it again instead of it ending for good.
+    """
     try:
         conn = get_pg_connection()
         cursor = conn.cursor()
         
-        cursor.execute(
-            """UPDATE public.schedules 
-               SET status = %s, last_status = %s, last_message = %s, 
-                   last_run = NOW(), updated_at = NOW()
-               WHERE name = %s""",
-            (status, 'success' if status == 'completed' else 'failed', message, schedule_name)
-        )
+        last_status = 'success' if status == 'completed' else 'failed'
+        if next_run is not None or recurring:
+            cursor.execute(
+                """UPDATE public.schedules 
+                   SET status = 'active', last_status = %s, last_message = %s, 
+                       last_run = NOW(), next_run = %s, updated_at = NOW()
+                   WHERE name = %s""",
+                (last_status, message, next_run, schedule_name)
+            )
+        else:
+            cursor.execute(
+                """UPDATE public.schedules 
+                   SET status = %s, last_status = %s, last_message = %s, 
+                       last_run = NOW(), updated_at = NOW()
+                   WHERE name = %s""",
+                (status, last_status, message, schedule_name)
+            )
         
         conn.commit()
         cursor.close()
@@ -161,8 +726,12 @@ def update_schedule_status(schedule_name, status, message):
     except Exception as e:
         logger.error(f"Error updating schedule status: {e}")
 
-def log_sync(schedule_name, schema, table, success, records, duration, error_msg=None):
-    """Log sync to sync_logs table"""
+def log_sync(schedule_name, schema, table, success, records, duration, error_msg=None,
+             sync_type='single_table', status=None, plan=None, run_id=None, target_db=None):
+    """Log sync to sync_logs table (run_id defaults to the current log context)
+
+    target_db names the PostgreSQL target of a fan-out run (NULL = main only).
+    """
     try:
         conn = get_pg_connection()
         cursor = conn.cursor()
@@ -171,12 +740,16 @@ def log_sync(schedule_name, schema, table, success, records, duration, error_msg
             """INSERT INTO public.sync_logs 
                (schedule_name, sync_type, source_schema, source_table, 
                 target_schema, target_table, records_synced, status, 
-                started_at, completed_at, duration_seconds, error_message)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            (schedule_name, 'single_table', schema, table, schema, table,
-             records, 'success' if success else 'failed',
+                started_at, completed_at, duration_seconds, error_message,
+                strategy, plan_reason, phase_timings, run_id, target_db)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            (schedule_name, sync_type, schema, table, schema, table,
+             records, status or ('success' if success else 'failed'),
              datetime.now() - timedelta(seconds=duration), datetime.now(),
-             duration, error_msg)
+             duration, error_msg,
+             plan.strategy if plan else None, plan.reason if plan else None,
+             Json(plan.phases) if plan and plan.phases else None,
+             run_id or get_log_context().get('run_id'), target_db)
         )
         
         conn.commit()
@@ -186,25 +759,270 @@ def log_sync(schedule_name, schema, table, success, records, duration, error_msg
     except Exception as e:
         logger.error(f"Error logging sync: {e}")
 
+def save_profile(profile, schedule_name, schema=None, table=None):
+    """Store a ProfileSession under the current run_id (no-op when not profiling)"""
+    if profile is None:
+        return None
+    try:
+        conn = get_pg_connection()
+        try:
+            profile_id = profile.save(conn, get_log_context().get('run_id'), schedule_name, schema, table)
+        finally:
+            conn.close()
+        logger.info(f"[{schedule_name}] Profile #{profile_id} saved\n{profile.summary()}")
+        return profile_id
+    except Exception as e:
+        logger.error(f"[{schedule_name}] Error saving profile: {e}")
+        return None
+
+def estimate_durations(cursor):
+    """Average successful run time per schedule over the last 30 days"""
+    cursor.execute(
+        """SELECT schedule_name, AVG(duration_seconds) FROM public.sync_logs
+           WHERE status = 'success' AND started_at > NOW() - INTERVAL '30 days'
+           GROUP BY schedule_name"""
+    )
+    return {name: float(avg) for name, avg in cursor.fetchall() if avg is not None}
+
+def compute_next_run(sched, after=None):
+    """Next start time for a recurring schedule
+
+    Without spread_minutes this is the cron fire time. With it, the start is
+    shifted inside [fire, fire + spread_minutes] to the slot that overlaps
+    least with other planned runs, using each schedule's average duration.
+    """
+    cron = CronExpression(sched['cron_expression'])
+    nominal = cron.next_fire(after or datetime.now())
+    window = sched.get('spread_minutes') or 0
+    
+    if window <= 0:
+        return nominal
+    
+    conn = get_pg_connection()
+    try:
+        cursor = conn.cursor()
+        durations = estimate_durations(cursor)
+        
+        cursor.execute(
+            """SELECT name, COALESCE(next_run,
+                   CASE WHEN schedule_date IS NOT NULL
+                        THEN CONCAT(schedule_date, ' ', schedule_time)::timestamp END)
+               FROM public.schedules
+               WHERE status IN ('active', 'running') AND name <> %s""",
+            (sched['name'],)
+        )
+        horizon = timedelta(days=1)
+        busy = [
+            (start, durations.get(name, DEFAULT_DURATION_SECONDS))
+            for name, start in cursor.fetchall()
+            if start is not None and nominal - horizon <= start <= nominal + horizon
+        ]
+        cursor.close()
+    finally:
+        conn.close()
+    
+    own_duration = durations.get(sched['name'], DEFAULT_DURATION_SECONDS)
+    return spread_start(nominal, own_duration, busy, window, sched['name'])
+
+def plan_next_run(sched, after=None):
+    """compute_next_run, falling back to the plain cron time if spreading fails
+
+    The spread needs PostgreSQL; a transient error there must not leave a
+    recurring schedule without a next run. Invalid cron still raises ValueError.
+    """
+    try:
+        return compute_next_run(sched, after)
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error(f"Schedule {sched['name']} spread failed, using the cron time: {e}")
+        return CronExpression(sched['cron_expression']).next_fire(after or datetime.now())
+
+def plan_recurring_schedules():
+    """Fill next_run for recurring schedules that don't have one yet"""
+    conn = get_pg_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(
+        """SELECT * FROM public.schedules
+           WHERE status = 'active' AND recurring AND next_run IS NULL"""
+    )
+    pending = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    
+    for sched in pending:
+        try:
+            next_run = plan_next_run(sched)
+        except ValueError as e:
+            logger.error(f"Schedule {sched['name']} has invalid cron '{sched['cron_expression']}': {e}")
+            update_schedule_status(sched['name'], 'failed', f"Invalid cron: {e}")
+            continue
+        
+        conn = get_pg_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE public.schedules SET next_run = %s, updated_at = NOW() WHERE name = %s",
+            (next_run, sched['name'])
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+        logger.info(f"Schedule {sched['name']} ({sched['cron_expression']}) next run: {next_run}")
+
+def run_status(success):
+    """sync_logs status of a run in the current job ('cancelled' once its token fired)"""
+    if success:
+        return 'success'
+    token = current_token()
+    return 'cancelled' if token and token.cancelled else 'failed'
+
+def schedule_target(sched):
+    """schema.table list of a schedule, as stored in sync_jobs.target"""
+    if sched.get('sync_type') == 'job_group':
+        return ','.join(f"{schema}.{table}" for schema, table in parse_table_list(sched.get('table_list')))
+    return f"{sched.get('source_schema')}.{sched.get('table_name')}"
+
+def run_single_table(sched):
+    """Run a single_table schedule, returns (success, message)"""
+    name = sched['name']
+    schema = sched['source_schema']
+    table = sched['table_name']
+    
+    targets = list(sched.get('targets') or [])
+    if targets and targets != [MAIN_TARGET]:
+        return run_fanout_table(sched, targets)
+    
+    logger.info(f"Running schedule: {name} ({schema}.{table})")
+    
+    start = datetime.now()
+    with maybe_profile(sched.get('profile'), name) as profile:
+        success, message, records, plan = run_planned_sync(
+            schema, table, name,
+            columns=sched.get('column_list'),
+            row_filter=sched.get('row_filter')
+        )
+    duration = int((datetime.now() - start).total_seconds())
+    
+    # Rows moved by a run we attached to are already logged by that run
+    logged_records = 0 if plan.strategy == planner.ATTACHED else records
+    log_sync(name, schema, table, success, logged_records, duration,
+            None if success else message, plan=plan, status=run_status(success))
+    save_profile(profile, name, schema, table)
+    
+    return success, message
+
+def run_fanout_table(sched, targets):
+    """single_table schedule with several targets: one extract, one sync_logs row per target"""
+    name = sched['name']
+    schema = sched['source_schema']
+    table = sched['table_name']
+    
+    logger.info(f"Running schedule: {name} ({schema}.{table} -> {', '.join(targets)})")
+    
+    start = datetime.now()
+    with maybe_profile(sched.get('profile'), name) as profile:
+        result, attached_run_id = run_single_flight(
+            schema, table,
+            lambda: sync_table_fanout(schema, table, name, targets,
+                                      columns=sched.get('column_list'),
+                                      row_filter=sched.get('row_filter')),
+            get_pg_connection,
+            run_id=get_log_context().get('run_id'),
+            targets=targets
+        )
+    duration = int((datetime.now() - start).total_seconds())
+    
+    if attached_run_id is not None:
+        success, message, records = result
+        plan = planner.SyncPlan(planner.ATTACHED, f"Joined run {attached_run_id} already in progress")
+        log_sync(name, schema, table, success, 0, duration,
+                None if success else message, plan=plan, status=run_status(success))
+    else:
+        success, message, records, results = result
+        for target, (status, target_msg, target_records, timings) in results.items():
+            plan = planner.SyncPlan(planner.FULL, f"Fan-out to {', '.join(targets)}")
+            plan.phases = timings
+            log_sync(name, schema, table, status == 'success', target_records, duration,
+                    None if status == 'success' else target_msg,
+                    plan=plan, status=status, target_db=target)
+    save_profile(profile, name, schema, table)
+    
+    return success, message
+
+def run_group(sched):
+    """Run a job_group schedule: all tables in FK order, one result for the group"""
+    name = sched['name']
+    tables = parse_table_list(sched.get('table_list'))
+    
+    if not tables:
+        return False, "Job group has no tables"
+    
+    logger.info(f"Running job group: {name} ({len(tables)} tables)")
+    
+    # The group replaces all members at the end, so it owns all of them for
+    # the whole run; single-table syncs of a member wait and take its result
+    run_id = get_log_context().get('run_id')
+    # Step timings per member (staging load + swap), logged as phase_timings
+    timings = {member: {} for member in tables}
+    
+    def sync_member(schema, table, group, into):
+        with thread_profile():
+            return sync_table(schema, table, group, timings=timings[(schema, table)], into=into)
+    
+    with TableLocks(get_pg_connection, tables) as locks:
+        with maybe_profile(sched.get('profile'), name) as profile:
+            success, message, results = run_job_group(name, tables, sync_member, get_pg_connection,
+                                                      timings=timings)
+        
+        for (schema, table), (status, member_msg, records, duration) in results.items():
+            if status == 'failed':
+                status = run_status(False)
+            plan = planner.SyncPlan(planner.FULL, f"Job group {name}: staged load + swap")
+            plan.phases = timings.get((schema, table)) or None
+            log_sync(name, schema, table, status == 'success', records, duration,
+                    None if status == 'success' else member_msg,
+                    sync_type='job_group', status=status, plan=plan)
+            try:
+                locks.publish(schema, table, run_id, status == 'success', member_msg, records)
+            except Exception as e:
+                logger.error(f"[{name}] Error publishing result of {schema}.{table}: {e}")
+    
+    save_profile(profile, name)
+    
+    return success, message
+
+SCHEDULE_RUNNERS = {
+    'single_table': run_single_table,
+    'job_group': run_group,
+}
+
 def check_and_run_schedules():
     """Check schedules and run sync if needed"""
     try:
         logger.info("=" * 50)
         logger.info("Checking schedules...")
         
+        ensure_schema()
+        plan_recurring_schedules()
+        
         # Get schedules yang waktunya sudah lewat
+        # - one-shot: schedule_date + schedule_time, run once
+        # - recurring: next_run from the cron expression
         conn = get_pg_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         cursor.execute(
             """SELECT * FROM public.schedules 
                WHERE status = 'active' 
-               AND sync_type = 'single_table'
-               AND CONCAT(schedule_date, ' ', schedule_time)::timestamp <= NOW()
-               AND (last_run IS NULL 
-                    OR last_run < CONCAT(schedule_date, ' ', schedule_time)::timestamp)
-               ORDER BY schedule_date, schedule_time
-               LIMIT 10"""
+               AND sync_type = ANY(%s)
+               AND ((recurring AND next_run <= %s)
+                    OR (NOT COALESCE(recurring, FALSE)
+                        AND CONCAT(schedule_date, ' ', schedule_time)::timestamp <= NOW()
+                        AND (last_run IS NULL 
+                             OR last_run < CONCAT(schedule_date, ' ', schedule_time)::timestamp)))
+               ORDER BY COALESCE(next_run, CONCAT(schedule_date, ' ', schedule_time)::timestamp)
+               LIMIT 10""",
+            (list(SCHEDULE_RUNNERS), datetime.now())
         )
         
         schedules = cursor.fetchall()
@@ -220,26 +1038,33 @@ def check_and_run_schedules():
         # Run each schedule
         for sched in schedules:
             name = sched['name']
-            schema = sched['source_schema']
-            table = sched['table_name']
-            
-            logger.info(f"Running schedule: {name} ({schema}.{table})")
             
             # Mark as running
             update_schedule_status(name, 'running', 'Sync in progress')
             
-            # Run sync
-            start = datetime.now()
-            success, message, records = sync_table(schema, table, name)
-            duration = int((datetime.now() - start).total_seconds())
+            # Run sync (every log line of this run carries schedule + run_id).
+            # JobWatch makes it cancellable (/sync cancel) and enforces max runtime.
+            with log_context(schedule=name, run_id=new_run_id()) as ctx:
+                try:
+                    with JobWatch(get_pg_connection, ctx['run_id'], name, schedule_target(sched),
+                                  sched.get('max_runtime_minutes')) as watch:
+                        success, message = SCHEDULE_RUNNERS[sched['sync_type']](sched)
+                    if watch.cancelled:
+                        success, message = False, f"Cancelled: {watch.reason}"
+                except Exception as e:
+                    logger.error(f"Schedule {name} error: {e}", exc_info=True)
+                    success, message = False, str(e)
             
-            # Update status
+            # Update status (recurring schedules get their next fire time)
             status = 'completed' if success else 'failed'
-            update_schedule_status(name, status, message)
-            
-            # Log to sync_logs
-            log_sync(name, schema, table, success, records, duration, 
-                    None if success else message)
+            next_run = None
+            if sched.get('recurring'):
+                try:
+                    next_run = plan_next_run(sched)
+                except Exception as e:
+                    # Stays active with next_run NULL, the next tick plans it again
+                    logger.error(f"Schedule {name} next run error: {e}")
+            update_schedule_status(name, status, message, next_run, sched.get('recurring'))
             
             logger.info(f"Schedule {name} finished: {message}")
         
@@ -249,6 +1074,7 @@ def check_and_run_schedules():
         logger.error(f"Error in check_and_run_schedules: {e}", exc_info=True)
 
 if __name__ == '__main__':
+    setup_logging()
     logger.info("Sync Scheduler Started")
     check_and_run_schedules()
     logger.info("Sync Scheduler Finished")
\ No newline at end of file
@@ -0,0 +1,84 @@
+import pytest
+
+from bulk_load import LoadPhase
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=None):
+        if query.startswith('CREATE INDEX') and self.db.fail_index:
+            raise Exception('could not create unique index')
+        self.db.executed.append(query)
+        if 'FROM public.sync_deferred_objects' in query and query.lstrip().startswith('SELECT'):
+            self.result = list(self.db.deferred)
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self, deferred, fail_index=False):
+        self.deferred = deferred
+        self.fail_index = fail_index
+        self.executed = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def ran(self, fragment):
+        return any(fragment in query for query in self.executed)
+
+
+DEFERRED = [
+    ('index', 'ix_orders_status', 'CREATE INDEX ix_orders_status ON public.orders (status)'),
+    ('triggers', 'USER', None),
+]
+
+
+def test_finish_rebuilds_enables_and_analyzes():
+    db = FakeDatabase(DEFERRED)
+    timings = {}
+    phase = LoadPhase(db.connect, 'public', 'orders', timings)
+
+    phase.finish()
+
+    assert phase.finished
+    assert db.ran('CREATE INDEX IF NOT EXISTS ix_orders_status')
+    assert db.ran('ENABLE TRIGGER USER')
+    assert db.ran('ANALYZE public.orders')
+    assert {'rebuild_indexes', 'enable_triggers', 'analyze'} <= set(timings)
+
+
+def test_failed_rebuild_still_enables_triggers():
+    db = FakeDatabase(DEFERRED, fail_index=True)
+    phase = LoadPhase(db.connect, 'public', 'orders', {})
+
+    with pytest.raises(RuntimeError, match='Index rebuild failed'):
+        phase.finish()
+
+    assert not phase.finished
+    assert db.ran('ENABLE TRIGGER USER')
+    # The index stays recorded for the next attempt
+    assert not db.ran("kind = 'index'")
+    assert not db.ran('ANALYZE')
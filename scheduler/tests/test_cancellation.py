@@ -0,0 +1,75 @@
+import time
+
+import cancellation
+from cancellation import JobWatch
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.row = None
+
+    def execute(self, query, params=None):
+        if query.lstrip().startswith('UPDATE public.sync_jobs SET heartbeat_at'):
+            self.db.heartbeats += 1
+            self.row = (self.db.cancel_requested, 'stopped by test')
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, db):
+        self.db = db
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def close(self):
+        pass
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.cancel_requested = False
+        self.heartbeats = 0
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.01)
+
+
+def test_heartbeat_continues_after_cancel(monkeypatch):
+    monkeypatch.setattr(cancellation, 'SYNC_CANCEL_POLL_SECONDS', 0.01)
+    db = FakeDatabase()
+    with JobWatch(db.connect, 'run-1', 'nightly', 'orders') as watch:
+        db.cancel_requested = True
+        wait_for(lambda: watch.cancelled)
+        fired_at = db.heartbeats
+        wait_for(lambda: db.heartbeats >= fired_at + 3)
+    assert watch.reason == 'stopped by test'
+
+
+def test_deadline_fires_once_and_keeps_heartbeating(monkeypatch):
+    monkeypatch.setattr(cancellation, 'SYNC_CANCEL_POLL_SECONDS', 0.01)
+    db = FakeDatabase()
+    with JobWatch(db.connect, 'run-2', 'nightly', 'orders', max_runtime_minutes=1) as watch:
+        watch.token.deadline = cancellation.datetime.now()
+        wait_for(lambda: watch.cancelled)
+        fired_at = db.heartbeats
+        # A later cancel request doesn't replace the first reason
+        db.cancel_requested = True
+        wait_for(lambda: db.heartbeats >= fired_at + 3)
+    assert watch.reason == 'max runtime of 1 min exceeded'
@@ -0,0 +1,125 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import pipeline
+import planner
+from sync_scheduler import apply_changes, build_delete, build_insert
+
+
+class FakeSourceCursor:
+    """fetchmany() over a fixed CHANGETABLE result"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def fetchmany(self, n):
+        batch, self.rows = self.rows[:n], self.rows[n:]
+        return batch
+
+
+class FakeTargetCursor:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def executemany(self, query, values):
+        self.statements.append((query, list(values)))
+
+    def close(self):
+        pass
+
+
+class FakeTargetConnection:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeTargetCursor(self.statements)
+
+    def commit(self):
+        self.commits += 1
+
+
+UPSERT = build_insert('public', 'orders', ['id', 'region', 'amount'], conflict_key=['id', 'region'])
+DELETE = build_delete('public', 'orders', ['id', 'region'])
+
+
+def applied(conn, query):
+    return [values for statement, batch in conn.statements if statement == query for values in batch]
+
+
+@pytest.mark.parametrize('depth', [0, 2])
+def test_apply_changes_splits_upserts_and_deletes(monkeypatch, depth):
+    monkeypatch.setattr(pipeline, 'SYNC_PIPELINE_DEPTH', depth)
+    # (present, key..., column...); deleted rows have NULL columns
+    rows = [
+        (1, 1, 'east', 1, 'east', Decimal('10.50')),
+        (0, 2, 'west', None, None, None),
+        (1, 3, 'west', 3, 'west', Decimal('7')),
+        (0, 4, 'east', None, None, None),
+        (0, 5, 'east', None, None, None),
+    ]
+    conn = FakeTargetConnection()
+
+    upserted, deleted = apply_changes(FakeSourceCursor(rows), conn, UPSERT, DELETE, 2, 'test')
+
+    assert (upserted, deleted) == (2, 3)
+    assert applied(conn, UPSERT) == [(1, 'east', 10.5), (3, 'west', 7.0)]
+    assert applied(conn, DELETE) == [(2, 'west'), (4, 'east'), (5, 'east')]
+    assert conn.commits >= 1
+
+
+@pytest.mark.parametrize('depth', [0, 2])
+def test_apply_changes_without_changes(monkeypatch, depth):
+    monkeypatch.setattr(pipeline, 'SYNC_PIPELINE_DEPTH', depth)
+    conn = FakeTargetConnection()
+
+    assert apply_changes(FakeSourceCursor([]), conn, UPSERT, DELETE, 2, 'test') == (0, 0)
+    assert conn.statements == []
+
+
+def test_build_delete():
+    assert DELETE == 'DELETE FROM public.orders WHERE "id" = %s AND "region" = %s'
+
+
+SOURCE = {
+    'row_count': 1000, 'size_mb': 1.0, 'key_columns': [('id', 'int')],
+    'rowversion_column': None, 'change_tracking': True,
+    'ct_current_version': 50, 'ct_min_valid_version': 10,
+}
+TARGET = {'exists': True, 'row_count': None, 'row_estimate': 1000, 'has_key': True}
+HISTORY = {'avg_duration': None, 'runs': 0}
+
+
+@pytest.mark.parametrize('state, strategy, reason', [
+    ({}, planner.FULL, 'no stored version'),
+    ({'ct_version': 5}, planner.FULL, 'below the retention minimum'),
+    ({'ct_version': 50}, planner.SKIP, 'No Change Tracking changes'),
+    ({'ct_version': 42}, planner.CHANGE_TRACKING, 'from version 42'),
+    # Exactly the minimum is still usable
+    ({'ct_version': 10}, planner.CHANGE_TRACKING, 'from version 10'),
+])
+def test_change_tracking_branches(state, strategy, reason):
+    chosen, why = planner.choose_strategy(SOURCE, TARGET, state, HISTORY, now=datetime(2026, 1, 1))
+    assert chosen == strategy
+    assert reason in why
+
+
+@pytest.mark.parametrize('source, target, columns', [
+    ({**SOURCE, 'change_tracking': False}, TARGET, None),
+    ({**SOURCE, 'key_columns': []}, TARGET, None),
+    (SOURCE, {**TARGET, 'has_key': False}, None),
+    (SOURCE, TARGET, ['id']),
+])
+def test_change_tracking_needs_key_and_full_table(source, target, columns):
+    chosen, _ = planner.choose_strategy(source, target, {'ct_version': 42}, HISTORY, columns=columns)
+    assert chosen not in (planner.CHANGE_TRACKING, planner.SKIP)
+
+
+def test_change_tracking_resync_of_large_table_is_partitioned(monkeypatch):
+    monkeypatch.setattr(planner, 'SYNC_PARTITION_MIN_ROWS', 100)
+    chosen, why = planner.choose_strategy(SOURCE, TARGET, {'ct_version': 5}, HISTORY)
+    assert chosen == planner.PARTITIONED
+    assert 'below the retention minimum' in why
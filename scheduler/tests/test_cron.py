@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+
+from cron import CronExpression, spread_start
+
+
+@pytest.mark.parametrize('expression, after, expected', [
+    # Steps, ranges, lists
+    ('*/15 * * * *', datetime(2026, 1, 1, 10, 7), datetime(2026, 1, 1, 10, 15)),
+    ('*/15 * * * *', datetime(2026, 1, 1, 10, 45), datetime(2026, 1, 1, 11, 0)),
+    ('5/20 * * * *', datetime(2026, 1, 1, 10, 26), datetime(2026, 1, 1, 10, 45)),
+    ('0 8-10,14 * * *', datetime(2026, 1, 1, 10, 30), datetime(2026, 1, 1, 14, 0)),
+    # Strictly after
+    ('0 3 * * *', datetime(2026, 1, 1, 3, 0), datetime(2026, 1, 2, 3, 0)),
+    ('0 3 * * *', datetime(2026, 12, 31, 4, 0), datetime(2027, 1, 1, 3, 0)),
+    # Month and day names (2026-01-01 is a Thursday)
+    ('0 9 * jan-mar mon-fri', datetime(2026, 1, 2, 9, 0), datetime(2026, 1, 5, 9, 0)),
+    ('0 9 * jan-mar mon-fri', datetime(2026, 3, 31, 9, 0), datetime(2027, 1, 1, 9, 0)),
+    ('0 0 * * sun', datetime(2026, 1, 1), datetime(2026, 1, 4)),
+    ('0 0 * * 7', datetime(2026, 1, 1), datetime(2026, 1, 4)),
+    ('0 0 * * 0', datetime(2026, 1, 1), datetime(2026, 1, 4)),
+    # Both day fields restricted: either matches (first of month OR Monday)
+    ('0 0 1 * mon', datetime(2026, 1, 1), datetime(2026, 1, 5)),
+    ('0 0 1 * mon', datetime(2026, 1, 26), datetime(2026, 2, 1)),
+    # Only day of month restricted
+    ('0 0 15 * *', datetime(2026, 1, 15), datetime(2026, 2, 15)),
+    # Leap day
+    ('30 2 29 2 *', datetime(2026, 1, 1), datetime(2028, 2, 29, 2, 30)),
+])
+def test_next_fire(expression, after, expected):
+    assert CronExpression(expression).next_fire(after) == expected
+
+
+@pytest.mark.parametrize('expression', [
+    '* * *',
+    '* * * * * *',
+    '60 * * * *',
+    '* 24 * * *',
+    '* * 0 * *',
+    '* * * 13 *',
+    '* * * * 8',
+    '*/0 * * * *',
+    '5-1 * * * *',
+    'x * * * *',
+    '0 0 * foo *',
+])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_never_fires():
+    with pytest.raises(ValueError, match='never fires'):
+        CronExpression('0 0 30 2 *').next_fire(datetime(2026, 1, 1))
+
+
+def test_str_normalizes_whitespace():
+    assert str(CronExpression(' 0  3 * *   * ')) == '0 3 * * *'
+
+
+def test_spread_start_avoids_busy_slot():
+    nominal = datetime(2026, 1, 1, 3, 0)
+    busy = [(nominal, 600)]
+    start = spread_start(nominal, 300, busy, 30, 'orders')
+    assert nominal + (start - nominal) >= datetime(2026, 1, 1, 3, 10)
+    assert start <= datetime(2026, 1, 1, 3, 30)
+
+
+def test_spread_start_without_window():
+    nominal = datetime(2026, 1, 1, 3, 0)
+    assert spread_start(nominal, 300, [(nominal, 600)], 0, 'orders') == nominal
+
+
+def test_spread_start_is_stable_per_key():
+    nominal = datetime(2026, 1, 1, 3, 0)
+    assert spread_start(nominal, 60, [], 15, 'a') == spread_start(nominal, 60, [], 15, 'a')
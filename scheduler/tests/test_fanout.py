@@ -0,0 +1,84 @@
+import time
+
+import fanout
+from fanout import SharedBatch, TargetWriter
+
+
+class SlowCursor:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def executemany(self, query, values):
+        time.sleep(self.seconds)
+
+    def close(self):
+        pass
+
+
+class SlowConnection:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.cancelled = False
+
+    def cursor(self):
+        return SlowCursor(self.seconds)
+
+    def commit(self):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+    def close(self):
+        pass
+
+
+def make_writer(monkeypatch, seconds_per_batch, window, ratio=0.5):
+    monkeypatch.setattr(fanout, 'SYNC_FANOUT_BUFFER', 1)
+    monkeypatch.setattr(fanout, 'SYNC_FANOUT_LAG_WINDOW_SECONDS', window)
+    monkeypatch.setattr(fanout, 'SYNC_FANOUT_LAG_RATIO', ratio)
+    writer = TargetWriter('reporting', lambda: SlowConnection(seconds_per_batch),
+                          'INSERT', 'nightly')
+    writer.start()
+    return writer
+
+
+def feed(writer, seconds, others_alive):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if not writer.put(SharedBatch([(1,)], 0, 1, lambda *args: None), others_alive):
+            return False
+    return True
+
+
+def test_sustained_lag_detaches(monkeypatch):
+    writer = make_writer(monkeypatch, 0.02, window=0.3)
+    assert not feed(writer, 2, others_alive=True)
+    writer.finish()
+    assert writer.detached
+    assert 'fell behind' in str(writer.error)
+
+
+def test_last_target_is_not_detached_for_lag(monkeypatch):
+    writer = make_writer(monkeypatch, 0.02, window=0.3)
+    assert feed(writer, 0.6, others_alive=False)
+    writer.finish()
+    assert writer.alive
+    assert writer.records > 0
+
+
+def test_lag_check_disabled(monkeypatch):
+    writer = make_writer(monkeypatch, 0.02, window=0.3, ratio=0)
+    assert feed(writer, 0.6, others_alive=True)
+    writer.finish()
+    assert writer.alive
+
+
+def test_stall_limit_scales_with_batch_time(monkeypatch):
+    monkeypatch.setattr(fanout, 'SYNC_FANOUT_STALL_SECONDS', 300)
+    writer = TargetWriter('reporting', None, 'INSERT', 'nightly')
+    assert writer.stall_seconds() == 300
+    writer.slowest_batch_seconds = 200
+    assert writer.stall_seconds() == 600
+    monkeypatch.setattr(fanout, 'SYNC_FANOUT_STALL_SECONDS', 0)
+    assert writer.stall_seconds() == 0
@@ -0,0 +1,82 @@
+import pytest
+
+from pushdown import build_select, validate_columns, validate_row_filter
+
+COLUMNS = ['id', 'status', 'created_at', 'Order Date']
+
+
+@pytest.mark.parametrize('predicate', [
+    "status = 'open'",
+    "status = N'buka'",
+    "status = 'it''s'",
+    "id > 100 AND (status IN ('a', 'b') OR status IS NULL)",
+    "created_at >= DATEADD(day, -7, GETDATE())",
+    "CAST(created_at AS date) = '2026-01-01'",
+    "YEAR(created_at) BETWEEN 2020 AND 2026",
+    "[Order Date] < SYSDATETIME()",
+    "UPPER(status) LIKE 'A%' ESCAPE '!'",
+    "status = '; DROP TABLE x --'",
+])
+def test_accepted_filters(predicate):
+    assert validate_row_filter(predicate, COLUMNS) == predicate.strip()
+
+
+@pytest.mark.parametrize('predicate, message', [
+    ("id = 1; DROP TABLE x", 'Unexpected character'),
+    ("id = 1 -- comment", 'Comments'),
+    ("id = 1 /* comment */", 'Comments'),
+    ("id IN (SELECT id FROM x)", 'Unknown column'),
+    ("status = @@version", 'Unexpected character'),
+    ("status = @p", 'Unexpected character'),
+    ("xp_cmdshell('dir') = 1", "Function 'xp_cmdshell'"),
+    ("OPENROWSET('a', 'b', 'c') = 1", "Function 'OPENROWSET'"),
+    ("(id = 1", 'Unbalanced'),
+    ("id = 1)", 'Unbalanced'),
+    ("status = 'open", 'Unexpected character'),
+    ("missing = 1", "Unknown column"),
+    ("", 'empty'),
+    ("   ", 'empty'),
+    ("id = 1" + " OR id = 1" * 200, 'longer than'),
+])
+def test_rejected_filters(predicate, message):
+    with pytest.raises(ValueError, match=message):
+        validate_row_filter(predicate, COLUMNS)
+
+
+@pytest.mark.parametrize('predicate', [
+    "id IN (SELECT id FROM x)",
+    "id = 1 UNION SELECT 1",
+    "WAITFOR = 1",
+    "exec = 1",
+])
+def test_forbidden_words_without_column_list(predicate):
+    with pytest.raises(ValueError, match='not allowed'):
+        validate_row_filter(predicate)
+
+
+def test_validate_columns_returns_source_case():
+    assert validate_columns(['ID', ' status ', 'id'], COLUMNS) == ['id', 'status']
+
+
+@pytest.mark.parametrize('columns, message', [
+    (['missing'], 'Unknown column'),
+    (['', ' '], 'empty'),
+])
+def test_validate_columns_rejects(columns, message):
+    with pytest.raises(ValueError, match=message):
+        validate_columns(columns, COLUMNS)
+
+
+def test_build_select_parenthesizes_filter():
+    query = build_select('dbo', 'orders', ['id', 'Order Date'], "status = 'a' OR id = 1")
+    assert query == ("SELECT [id], [Order Date] FROM [dbo].[orders] "
+                     "WHERE (status = 'a' OR id = 1)")
+
+
+def test_build_select_quotes_identifiers():
+    assert build_select('dbo', 'odd]name') == 'SELECT * FROM [dbo].[odd]]name]'
+
+
+def test_build_select_revalidates_filter():
+    with pytest.raises(ValueError):
+        build_select('dbo', 'orders', row_filter='1=1; SHUTDOWN')